@@ -167,30 +167,60 @@ async function handleExecuteQueries(queries, isResume) {
     await chrome.storage.local.set({ executionState: null });
   }
 
-const { initialProfile, executedQueries: allQueries } = await chrome.storage.local.get(['initialProfile', 'executedQueries']);
-if (initialProfile && allQueries?.length > 0) {
-  try {
-    const updatedSearches = allQueries.map(q => ({ query: q.query, timestamp: q.timestamp }));
-    
-    const analyzeResp = await fetch(`${API_BASE_URL}/api/analyze-profile`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ searches: updatedSearches })
-    });
-    const { profile: updatedProfile } = await analyzeResp.json();
+  const { initialProfile, searchHistory, profileSessionId, executedQueries: allQueries } =
+    await chrome.storage.local.get(['initialProfile', 'searchHistory', 'profileSessionId', 'executedQueries']);
+  // A session reopened by the fallback below replaces the one of initialProfile
+  const initialSessionId = initialProfile?.metadata?.session_id;
+  const sessionId = profileSessionId || initialSessionId;
+  let sessionUpdated = false;
+  if (sessionId && newExecuted.length > 0) {
+    try {
+      const sessionResp = await fetch(`${API_BASE_URL}/api/profile-sessions/${sessionId}/searches`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ searches: newExecuted.map(q => ({ query: q.query, timestamp: q.timestamp })) })
+      });
+      if (sessionResp.ok) {
+        const { profile: updatedProfile, comparison } = await sessionResp.json();
+        // A reopened session compares against its own start, not initialProfile
+        const profileComparison = sessionId === initialSessionId
+          ? comparison
+          : await compareProfiles(initialProfile, updatedProfile);
+        await chrome.storage.local.set({ updatedProfile, profileComparison });
+        sessionUpdated = true;
+      }
+    } catch (e) {
+      console.error('Profile session update failed:', e);
+    }
+  }
+  if (!sessionUpdated && initialProfile && allQueries?.length > 0) {
+    try {
+      // The original history plus every executed query, so nothing is lost
+      // when a session update fails; later runs update the new session
+      const updatedSearches = [
+        ...(searchHistory || []),
+        ...allQueries.map(q => ({ query: q.query, timestamp: q.timestamp }))
+      ];
+
+      const analyzeResp = await fetch(`${API_BASE_URL}/api/analyze-profile`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ searches: updatedSearches })
+      });
+      if (!analyzeResp.ok) throw new Error(`analyze-profile returned ${analyzeResp.status}`);
+      const { profile: updatedProfile, session_id } = await analyzeResp.json();
 
-    const compareResp = await fetch(`${API_BASE_URL}/api/compare-profiles`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ initialProfile, updatedProfile })
-    });
-    const { comparison } = await compareResp.json();
+      const comparison = await compareProfiles(initialProfile, updatedProfile);
 
-    await chrome.storage.local.set({ updatedProfile, profileComparison: comparison });
-  } catch (e) {
-    console.error('Profile comparison failed:', e);
+      await chrome.storage.local.set({
+        updatedProfile,
+        profileComparison: comparison,
+        profileSessionId: session_id
+      });
+    } catch (e) {
+      console.error('Profile comparison failed:', e);
+    }
   }
-}
 
   isExecuting = false;
   stopRequested = false;
@@ -203,6 +233,16 @@ if (initialProfile && allQueries?.length > 0) {
   }).catch(() => {});
 }
 
+async function compareProfiles(initialProfile, updatedProfile) {
+  const compareResp = await fetch(`${API_BASE_URL}/api/compare-profiles`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ initialProfile, updatedProfile })
+  });
+  const { comparison } = await compareResp.json();
+  return comparison;
+}
+
 async function resumeExecution() {
   await handleExecuteQueries([], true);
 }
@@ -0,0 +1,228 @@
+"""
+Async serving mode for the Privacy Shield API.
+
+/api/stream, /api/recommendations and /api/generate-personas are served as
+native coroutines: SSE connections wait on their channel and Ollama calls are
+awaited, so neither parks a worker thread. Ollama calls still go through the
+shared LLM scheduler (interactive for recommendations, batch for personas), so
+priorities, queue limits and per-client rates apply as on the Flask routes.
+With BATCHED_PERSONA_GENERATION the single batched persona call is made by
+the synchronous recommender on the persona executor, as the Flask route does.
+Every other route is the Flask app from flask_app.py mounted unchanged, so
+routes and JSON shapes are identical.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5001
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import flask_app
+from flask_app import (
+    BATCHED_PERSONA_GENERATION,
+    LLM_SCHEDULER,
+    PERSONA_COUNT,
+    PERSONA_GENERATION_CONCURRENCY,
+    PERSONA_GENERATION_TIMEOUT,
+    SSE_HEARTBEAT_INTERVAL,
+    build_persona,
+    persona_executor,
+    record_request,
+    recommender,
+    select_inverse_personas,
+    sse_hub,
+)
+from llm_scheduler import BATCH, INTERACTIVE, LLMOverloaded, llm_priority
+from utils import AsyncOllamaClient
+
+ollama: AsyncOllamaClient = None
+
+
+def _client_id(request) -> str:
+    return (
+        request.headers.get("X-Client-Id")
+        or request.query_params.get("client_id")
+        or (request.client.host if request.client else "unknown")
+    )
+
+
+async def _recommend(persona_id: str, client_id: str, priority: str):
+    with llm_priority(priority, client_id):
+        return await recommender.get_search_query_recommendations_async(
+            persona_id, ollama, client_id=client_id
+        )
+
+
+def _overloaded_response(e: LLMOverloaded):
+    status = 429 if e.reason == 'rate_limited' else 503
+    return JSONResponse({'success': False, 'error': str(e)}, status_code=status,
+                        headers={'Retry-After': str(int(e.retry_after))})
+
+
+async def stream(request):
+    client_id = _client_id(request)
+    channel = sse_hub.connect(client_id)
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.query_params.get("last_event_id")
+    try:
+        cursor = int(last_event_id)
+    except (TypeError, ValueError):
+        cursor = channel.latest_id
+
+    async def event_stream():
+        nonlocal cursor
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                events = await channel.read_async(cursor, timeout=SSE_HEARTBEAT_INTERVAL)
+                if not events:
+                    yield ": heartbeat\n\n"
+                    continue
+                for event_id, data, event in events:
+                    name = f"event: {event}\n" if event else ""
+                    yield f"id: {event_id}\n{name}data: {data}\n\n"
+                    cursor = event_id
+        finally:
+            sse_hub.disconnect(client_id)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+async def get_recommendations(request):
+    persona_id = request.query_params.get("persona_id")
+    if not persona_id:
+        return JSONResponse({"error": "Missing required query parameter: persona_id"}, status_code=400)
+
+    try:
+        queries = await _recommend(persona_id, _client_id(request), INTERACTIVE)
+        return JSONResponse({"persona_id": persona_id, "queries": queries})
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    except LLMOverloaded as e:
+        return _overloaded_response(e)
+    except RuntimeError as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def generate_personas(request):
+    try:
+        data = await request.json()
+        profile = data.get('profile', {})
+        count = data.get('count', PERSONA_COUNT)
+
+        if not profile:
+            return JSONResponse({'error': 'No profile provided'}, status_code=400)
+
+        # Shed at once rather than queue behind a full batch queue
+        LLM_SCHEDULER.check(BATCH)
+        selected_persona_ids = await run_in_threadpool(select_inverse_personas, profile, count)
+        client_id = _client_id(request)
+
+        if BATCHED_PERSONA_GENERATION:
+            (batch,) = LLM_SCHEDULER.submit(persona_executor, BATCH, client_id, [
+                partial(recommender.get_batch_recommendations, selected_persona_ids, client_id=client_id)
+            ])
+            try:
+                batched = await asyncio.wait_for(asyncio.wrap_future(batch), PERSONA_GENERATION_TIMEOUT)
+                results = [batched.get(pid, KeyError(pid)) for pid in selected_persona_ids]
+            except Exception as e:
+                results = [e] * len(selected_persona_ids)
+        else:
+            results = await asyncio.gather(
+                *(asyncio.wait_for(_recommend(pid, client_id, BATCH), PERSONA_GENERATION_TIMEOUT)
+                  for pid in selected_persona_ids),
+                return_exceptions=True
+            )
+
+        personas = []
+        failed_personas = []
+        overloaded = []
+        for i, (persona_id, result) in enumerate(zip(selected_persona_ids, results)):
+            if isinstance(result, BaseException):
+                print(f"Error generating queries for {persona_id}: {result!r}")
+                failed_personas.append(persona_id)
+                if isinstance(result, LLMOverloaded):
+                    overloaded.append(result)
+                result = []
+            personas.append(build_persona(i, persona_id, result))
+
+        if overloaded and len(overloaded) == len(selected_persona_ids):
+            return _overloaded_response(max(overloaded, key=lambda e: e.retry_after))
+
+        return JSONResponse({
+            'success': True,
+            'personas': personas,
+            'count': len(personas),
+            'failed_personas': failed_personas
+        })
+
+    except LLMOverloaded as e:
+        return _overloaded_response(e)
+    except Exception as e:
+        print(f"Error in generate_personas: {str(e)}")
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+def timed(route: str, handler):
+    """Record native routes in the same request metrics as the Flask ones."""
+    async def endpoint(request):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status_code
+            return response
+        finally:
+            record_request(request.method, route, request.url.path, status, time.perf_counter() - started)
+    return endpoint
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    global ollama
+    ollama = AsyncOllamaClient(pool_size=PERSONA_GENERATION_CONCURRENCY)
+    try:
+        yield
+    finally:
+        await ollama.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/stream", timed("/api/stream", stream), methods=["GET"]),
+        Route("/api/recommendations", timed("/api/recommendations", get_recommendations), methods=["GET"]),
+        Route("/api/generate-personas", timed("/api/generate-personas", generate_personas), methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app.app)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    print("=" * 60)
+    print("Async API available at: http://localhost:5001")
+    print("=" * 60)
+
+    uvicorn.run(app, host="0.0.0.0", port=5001)
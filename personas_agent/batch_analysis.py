@@ -0,0 +1,120 @@
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from keyword_matcher import KeywordMatcher
+
+
+class BatchProfileScorer:
+    """
+    Scores demographics and interests for many users at once.
+
+    Each user's keyword hits become one row of a sparse user x keyword matrix;
+    every dimension of the matcher is a sparse keyword x label indicator
+    matrix, so a single product gives every user's label scores. The results
+    are the same values ProfileAnalyzer.analyze() computes one user at a time.
+
+    `demographic_dimensions` maps a profile key to (matcher dimension, value
+    key, score at which confidence reaches 1.0), like DEMOGRAPHIC_DIMENSIONS.
+    """
+
+    def __init__(self, matcher: KeywordMatcher, demographic_dimensions: Dict[str, Tuple[str, str, float]],
+                 interest_dimension: str = 'interests', top_interests: int = 5):
+        self.demographic_dimensions = demographic_dimensions
+        self.interest_dimension = interest_dimension
+        self.top_interests = top_interests
+
+        self.keywords = list(matcher.keyword_labels)
+        self._column = {kw: i for i, kw in enumerate(self.keywords)}
+        self.labels = {dimension: list(table) for dimension, table in matcher.tables.items()}
+
+        # A keyword listed twice under one label scores twice, as in
+        # KeywordMatcher.score(); duplicate entries are summed by csr_matrix.
+        self._indicators = {}
+        for dimension, labels in self.labels.items():
+            label_index = {label: j for j, label in enumerate(labels)}
+            rows, cols = [], []
+            for kw, pairs in matcher.keyword_labels.items():
+                for kw_dimension, label in pairs:
+                    if kw_dimension == dimension:
+                        rows.append(self._column[kw])
+                        cols.append(label_index[label])
+            self._indicators[dimension] = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                shape=(len(self.keywords), len(labels))
+            )
+
+    def keyword_matrix(self, keyword_counts: Sequence[Mapping[str, int]]) -> sparse.csr_matrix:
+        """Sparse user x keyword matrix of hit counts, built in one pass."""
+        indptr, indices, data = [0], [], []
+        for counts in keyword_counts:
+            for kw, count in counts.items():
+                column = self._column.get(kw)
+                if column is not None and count > 0:
+                    indices.append(column)
+                    data.append(count)
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.array(data, dtype=np.int64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(keyword_counts), len(self.keywords))
+        )
+
+    def label_scores(self, counts: sparse.csr_matrix) -> Dict[str, np.ndarray]:
+        """Per dimension, a dense user x label matrix of distinct matched keywords."""
+        present = (counts > 0).astype(np.int64)
+        return {dimension: (present @ indicator).toarray() for dimension, indicator in self._indicators.items()}
+
+    def score(self, keyword_counts: Sequence[Mapping[str, int]], total_searches: Sequence[int],
+              extra_interests: Optional[Sequence[Mapping[str, int]]] = None
+              ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        (demographics, interests) for each user, in input order.
+        `extra_interests` adds per-user category counts found by other means,
+        like ProfileAnalyzer.embedded_scores.
+        """
+        users = len(keyword_counts)
+        scores = self.label_scores(self.keyword_matrix(keyword_counts))
+        if extra_interests is not None:
+            column = {label: j for j, label in enumerate(self.labels[self.interest_dimension])}
+            matrix = scores[self.interest_dimension]
+            for user, counts in enumerate(extra_interests):
+                for label, count in counts.items():
+                    matrix[user, column[label]] += count
+        demographics = [{} for _ in range(users)]
+
+        for key, (dimension, value_key, full_confidence_at) in self.demographic_dimensions.items():
+            labels = self.labels[dimension]
+            matrix = scores[dimension]
+            top = matrix.max(axis=1)
+            # argmax picks the first label on ties, like max(scores, key=scores.get)
+            best = matrix.argmax(axis=1).tolist()
+            confidence = np.minimum(top / full_confidence_at, 1.0).tolist()
+            rows = matrix.tolist()
+            for user, has_score in enumerate((top > 0).tolist()):
+                if not has_score:
+                    demographics[user][key] = {value_key: 'unknown', 'confidence': 0.0}
+                    continue
+                demographics[user][key] = {
+                    value_key: labels[best[user]],
+                    'confidence': confidence[user],
+                    'scores': dict(zip(labels, rows[user]))
+                }
+
+        labels = self.labels[self.interest_dimension]
+        matrix = scores[self.interest_dimension]
+        totals = np.asarray(total_searches, dtype=np.float64)
+        percentages = (matrix / totals[:, None] * 100).tolist()
+        # Stable so equal counts keep the category order, as sorted() does
+        order = np.argsort(-matrix, axis=1, kind='stable').tolist()
+        rows = matrix.tolist()
+
+        interests = []
+        for user in range(users):
+            categories = {
+                labels[j]: {'count': rows[user][j], 'percentage': percentages[user][j]}
+                for j in order[user] if rows[user][j] > 0
+            }
+            interests.append({'categories': categories, 'top_interests': list(categories)[:self.top_interests]})
+
+        return list(zip(demographics, interests))
@@ -0,0 +1,97 @@
+"""
+Compare batched multi-persona prompts against one prompt per persona.
+
+Runs against the Ollama server at OLLAMA_HOST (or --base-url) and reports
+end-to-end latency, LLM calls and token throughput for each mode:
+
+    python benchmark_batching.py --personas 5 --rounds 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from personas_agent import PERSONAS, PersonaSearchRecommender
+from utils import OLLAMA_BASE_URL, OllamaClient, set_ollama_client
+
+
+class RecordingOllamaClient(OllamaClient):
+    """OllamaClient that totals the token counts and durations Ollama reports."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.prompt_ns = 0
+        self.eval_tokens = 0
+        self.eval_ns = 0
+
+    def generate_raw(self, *args, **kwargs):
+        data = super().generate_raw(*args, **kwargs)
+        self.calls += 1
+        self.prompt_tokens += data.get("prompt_eval_count", 0)
+        self.prompt_ns += data.get("prompt_eval_duration", 0)
+        self.eval_tokens += data.get("eval_count", 0)
+        self.eval_ns += data.get("eval_duration", 0)
+        return data
+
+
+def run_mode(name, generate, persona_ids, rounds, client):
+    latencies = []
+    client.reset()
+    produced = 0
+
+    for _ in range(rounds):
+        started = time.perf_counter()
+        results = generate(persona_ids)
+        latencies.append(time.perf_counter() - started)
+        produced += sum(len(q) for q in results.values())
+
+    eval_seconds = client.eval_ns / 1e9
+    prompt_seconds = client.prompt_ns / 1e9
+    print(f"\n{name}")
+    print(f"  end-to-end latency  mean {statistics.mean(latencies):.2f}s  "
+          f"p50 {statistics.median(latencies):.2f}s  max {max(latencies):.2f}s")
+    print(f"  LLM calls           {client.calls} ({client.calls / rounds:.1f} per round)")
+    print(f"  queries produced    {produced} ({produced / rounds:.1f} per round)")
+    print(f"  prompt tokens       {client.prompt_tokens} in {prompt_seconds:.2f}s")
+    print(f"  eval tokens         {client.eval_tokens} in {eval_seconds:.2f}s"
+          f" ({client.eval_tokens / eval_seconds if eval_seconds else 0:.1f} tokens/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default=OLLAMA_BASE_URL)
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--personas", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    client = RecordingOllamaClient(args.base_url)
+    set_ollama_client(client)
+
+    recommender = PersonaSearchRecommender(model=args.model)
+    persona_ids = [p["id"] for p in PERSONAS[:args.personas]]
+    print(f"Benchmarking {len(persona_ids)} personas x {args.rounds} rounds against {args.base_url}")
+
+    run_mode(
+        "per-persona prompts",
+        lambda ids: {pid: recommender.get_search_query_recommendations(pid) for pid in ids},
+        persona_ids, args.rounds, client,
+    )
+    run_mode(
+        "batched prompt",
+        recommender.get_batch_recommendations,
+        persona_ids, args.rounds, client,
+    )
+
+
+if __name__ == "__main__":
+    main()
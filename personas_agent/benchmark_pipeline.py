@@ -0,0 +1,281 @@
+"""
+Headless benchmark of the obfuscation pipeline: analyze -> select personas ->
+generate queries -> re-analyze -> compare.
+
+Synthesizes search histories, drives ProfileAnalyzer, select_inverse_personas,
+PersonaSearchRecommender and ProfileComparator for each one, and reports
+per-stage latency percentiles, searches/queries per second, peak memory and
+the obfuscation score. Query generation runs against a deterministic Ollama
+stub started in-process, so runs are comparable (pass --base-url to use a
+real server instead):
+
+    python benchmark_pipeline.py --users 50 --searches 2000
+    python benchmark_pipeline.py --json run.json
+    python benchmark_pipeline.py --baseline run.json --tolerance 0.25
+
+With --baseline, exits with status 1 when any stage's p95 latency grew or
+the mean obfuscation score dropped by more than the tolerance.
+
+Approved queries are not dispatched: QueryScheduler paces them seconds apart
+by design, so they are fed to the re-analysis directly.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import OLLAMA_BASE_URL, OllamaClient, set_ollama_client
+
+STAGES = ("analyze", "select", "generate", "reanalyze", "compare")
+
+QUERY_TEMPLATES = (
+    "best {}", "how to get into {}", "{} for beginners", "cheap {}", "{} near me",
+    "{} reviews", "is {} worth it", "{} tips", "top 10 {}", "{} guide 2025",
+)
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Answers /api/generate with queries built from the persona's interests in
+    the prompt, seeded by prompt and call number so every run sees the same
+    sequence. Batched prompts get a JSON object keyed by persona id.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    calls = 0
+    calls_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _queries(self, seed: str, interests: str):
+        rng = random.Random(seed)
+        topics = [t.strip() for t in interests.split(",") if t.strip()]
+        return [rng.choice(QUERY_TEMPLATES).format(rng.choice(topics)) + f" {rng.randint(1, 999)}"
+                for _ in range(10)]
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with StubOllamaHandler.calls_lock:
+            StubOllamaHandler.calls += 1
+            call = StubOllamaHandler.calls
+
+        if self.path == "/api/embed":
+            vectors = []
+            for text in body["input"]:
+                v = [0.0] * 64
+                for word in re.findall(r"\w+", text.lower()):
+                    v[zlib.crc32(word.encode()) % 64] += 1.0
+                vectors.append(v)
+            payload = {"embeddings": vectors}
+        else:
+            prompt = body["prompt"]
+            batch = re.findall(r'- id "(\w+)": .*?\(interests: (.*?)\)', prompt)
+            if batch:
+                response = json.dumps({pid: self._queries(f"{pid}-{call}", interests) for pid, interests in batch})
+            else:
+                interests = re.search(r"Interests: (.*)", prompt)
+                response = json.dumps(self._queries(f"{prompt}-{call}", interests.group(1) if interests else "news"))
+            payload = {
+                "response": response,
+                "done": True,
+                "prompt_eval_count": len(prompt.split()),
+                "prompt_eval_duration": int(self.latency * 0.2 * 1e9),
+                "eval_count": len(response.split()),
+                "eval_duration": int(self.latency * 0.8 * 1e9),
+            }
+
+        time.sleep(self.latency)
+        out = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+def start_stub(latency: float) -> str:
+    StubOllamaHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    threading.Thread(target=server.serve_forever, name="ollama-stub", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def synthesize_history(fa, size: int, rng: random.Random):
+    """
+    A history with a few dominant interests and one demographic signal per
+    dimension, mixed with keyword-free filler, in epoch milliseconds.
+    """
+    favourites = rng.sample(sorted(fa.CATEGORIES), 3)
+    signals = [rng.choice(list(table.values())) for table in
+               (fa.AGE_PATTERNS, fa.GENDER_PATTERNS, fa.PROFESSION_PATTERNS, fa.MARITAL_PATTERNS)]
+    filler = ["weather", "tomorrow", "nearby", "open", "hours", "meaning", "lyrics", "translate", "definition", "2025"]
+
+    ts = 1704067200000 + rng.randint(0, 10**10)
+    history = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < 0.5:
+            words = [rng.choice(fa.CATEGORIES[rng.choice(favourites)])]
+        elif roll < 0.7:
+            words = [rng.choice(rng.choice(signals))]
+        else:
+            words = []
+        words += rng.sample(filler, rng.randint(1, 3))
+        rng.shuffle(words)
+        ts += rng.randint(30_000, 6 * 60 * 60 * 1000)
+        history.append({"query": " ".join(words), "timestamp": ts})
+    return history
+
+
+def percentiles(values):
+    if len(values) < 2:
+        value = values[0] if values else 0.0
+        return {"p50": value, "p95": value, "p99": value, "max": value}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": max(values)}
+
+
+def run(args):
+    # Importing flask_app would otherwise start refilling query reservoirs in
+    # the background, competing with the measured stages for the model server
+    os.environ.setdefault("PREGENERATE_QUERIES", "0")
+    import flask_app as fa
+    from personas_agent import PersonaSearchRecommender
+    from query_cache import QueryCache
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    recommender = PersonaSearchRecommender(model=args.model, cache=QueryCache())
+    timings = {stage: [] for stage in STAGES}
+    obfuscation = []
+    searches_analyzed = 0
+    queries_generated = 0
+
+    started = time.perf_counter()
+    for user in range(args.users):
+        history = synthesize_history(fa, args.searches, rng)
+
+        t = time.perf_counter()
+        analyzer = fa.ProfileAnalyzer(history)
+        initial = analyzer.analyze()
+        timings["analyze"].append(time.perf_counter() - t)
+        searches_analyzed += len(history)
+
+        t = time.perf_counter()
+        persona_ids = fa.select_inverse_personas(initial, args.personas)
+        timings["select"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        queries = []
+        for persona_id in persona_ids:
+            queries += recommender.get_search_query_recommendations(persona_id, client_id=f"user-{user}")
+        timings["generate"].append(time.perf_counter() - t)
+        queries_generated += len(queries)
+
+        t = time.perf_counter()
+        now = history[-1]["timestamp"]
+        analyzer.update({"query": q, "timestamp": now + i * 4000} for i, q in enumerate(queries))
+        updated = analyzer.analyze()
+        timings["reanalyze"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        comparison = fa.ProfileComparator(initial, updated).compare()
+        timings["compare"].append(time.perf_counter() - t)
+        obfuscation.append(comparison["obfuscation_score"])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "config": {k: getattr(args, k) for k in ("users", "searches", "personas", "seed", "stub_latency", "model")},
+        "stages_ms": {stage: {k: v * 1000 for k, v in percentiles(values).items()} for stage, values in timings.items()},
+        "elapsed_s": elapsed,
+        "searches_per_s": searches_analyzed / sum(timings["analyze"] + timings["reanalyze"]),
+        "queries_per_s": queries_generated / sum(timings["generate"]) if queries_generated else 0.0,
+        "users_per_s": args.users / elapsed,
+        "llm_calls": StubOllamaHandler.calls,
+        # Linux reports kilobytes, macOS bytes
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != "darwin" else 1024 ** 2),
+        "obfuscation_score": {
+            "mean": statistics.mean(obfuscation),
+            "min": min(obfuscation),
+            "max": max(obfuscation),
+        },
+    }
+
+
+def report(results):
+    config = results["config"]
+    print(f"\n{config['users']} users x {config['searches']} searches, {config['personas']} personas each")
+    print(f"{'stage':<10} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)")
+    for stage, p in results["stages_ms"].items():
+        print(f"{stage:<10} {p['p50']:>9.2f} {p['p95']:>9.2f} {p['p99']:>9.2f} {p['max']:>9.2f}")
+    print(f"searches analyzed/s  {results['searches_per_s']:.0f}")
+    print(f"queries generated/s  {results['queries_per_s']:.1f} ({results['llm_calls']} LLM calls)")
+    print(f"users/s              {results['users_per_s']:.2f}")
+    print(f"peak RSS             {results['peak_rss_mb']:.1f} MB")
+    o = results["obfuscation_score"]
+    print(f"obfuscation score    mean {o['mean']:.2f}  min {o['min']:.2f}  max {o['max']:.2f}")
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for stage, p in results["stages_ms"].items():
+        before = baseline.get("stages_ms", {}).get(stage, {}).get("p95")
+        if before and p["p95"] > before * (1 + tolerance):
+            found.append(f"{stage} p95 {before:.2f}ms -> {p['p95']:.2f}ms")
+    before = baseline.get("obfuscation_score", {}).get("mean")
+    after = results["obfuscation_score"]["mean"]
+    if before and after < before * (1 - tolerance):
+        found.append(f"obfuscation score {before:.2f} -> {after:.2f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--searches", type=int, default=500, help="searches per synthetic history")
+    parser.add_argument("--personas", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="seconds per stub LLM call")
+    parser.add_argument("--base-url", help=f"use a real Ollama server (e.g. {OLLAMA_BASE_URL}) instead of the stub")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Install the client before flask_app is imported so nothing it starts
+    # talks to a real server
+    set_ollama_client(OllamaClient(args.base_url or start_stub(args.stub_latency)))
+
+    results = run(args)
+    report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION: {line}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Added to every count so labels missing on one side keep KL finite
+SMOOTHING = 1e-3
+
+
+def score_vectors(profile: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Per dimension ('age_range', ..., 'interests'), the label -> score counts of a profile."""
+    vectors = {
+        key: dict(value.get('scores', {}))
+        for key, value in profile.get('demographics', {}).items()
+        if isinstance(value, dict)
+    }
+    vectors['interests'] = {
+        category: info.get('count', 0)
+        for category, info in profile.get('interests', {}).get('categories', {}).items()
+    }
+    return vectors
+
+
+def _probabilities(counts: np.ndarray) -> np.ndarray:
+    smoothed = counts + SMOOTHING
+    return smoothed / smoothed.sum(axis=1, keepdims=True)
+
+
+def entropy(p: np.ndarray) -> np.ndarray:
+    """Shannon entropy in bits of each row."""
+    return -(p * np.log2(p)).sum(axis=1)
+
+
+def kl_divergence(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """KL(p || q) in bits, row-wise; q broadcasts against p."""
+    return (p * np.log2(p / q)).sum(axis=1)
+
+
+def js_divergence(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Jensen-Shannon divergence in bits (0 to 1), row-wise."""
+    m = (p + q) / 2
+    return (kl_divergence(p, m) + kl_divergence(q, m)) / 2
+
+
+def distribution_changes(initial: Dict[str, Any], updated: Sequence[Dict[str, Any]]) -> List[Dict[str, Optional[Dict[str, float]]]]:
+    """
+    How far each updated profile's score distributions moved from the
+    initial profile's, per dimension: entropy before and after, and KL and JS
+    divergence of updated from initial. All updated profiles are computed
+    together as one matrix per dimension. A dimension with no scores on
+    either side is None.
+    """
+    baseline = score_vectors(initial)
+    series = [score_vectors(profile) for profile in updated]
+    results: List[Dict[str, Optional[Dict[str, float]]]] = [{} for _ in updated]
+
+    for dimension, initial_scores in baseline.items():
+        # Labels in a stable order: the baseline's, then any new ones
+        labels = list(initial_scores)
+        seen = set(labels)
+        for vectors in series:
+            for label in vectors.get(dimension, {}):
+                if label not in seen:
+                    seen.add(label)
+                    labels.append(label)
+
+        if not labels:
+            for result in results:
+                result[dimension] = None
+            continue
+
+        before = np.array([[initial_scores.get(label, 0) for label in labels]], dtype=np.float64)
+        after = np.array([[vectors.get(dimension, {}).get(label, 0) for label in labels] for vectors in series],
+                         dtype=np.float64).reshape(len(series), len(labels))
+        empty = ((before.sum() == 0) | (after.sum(axis=1) == 0)).tolist()
+
+        p_before = _probabilities(before)
+        p_after = _probabilities(after)
+        entropy_before = float(entropy(p_before)[0])
+        entropy_after = entropy(p_after).tolist()
+        kl = kl_divergence(p_after, p_before).tolist()
+        js = js_divergence(p_after, p_before).tolist()
+
+        for i, result in enumerate(results):
+            if empty[i]:
+                result[dimension] = None
+                continue
+            result[dimension] = {
+                'entropy_initial': round(entropy_before, 4),
+                'entropy_updated': round(entropy_after[i], 4),
+                'entropy_change': round(entropy_after[i] - entropy_before, 4),
+                'kl_divergence': round(kl[i], 4),
+                'js_divergence': round(js[i], 4)
+            }
+
+    return results
@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+# texts -> one vector per text, e.g. utils.embed_texts
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+class EmbeddingCache:
+    """
+    Unit-length embedding vectors keyed by text, in an in-memory LRU that can
+    optionally be persisted to SQLite. Repeated queries are never embedded
+    twice, and persona/category vectors survive restarts when persisted.
+    """
+
+    def __init__(self, max_entries: int = 50000, db_path: Optional[str] = None, namespace: str = ''):
+        self.max_entries = max_entries
+        # Vectors from different models must not mix; key rows by model name
+        self.namespace = namespace
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "namespace TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (namespace, text))"
+            )
+            self._db.commit()
+
+    def get_many(self, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for text in texts:
+                vector = self._vectors.get(text)
+                if vector is None and self._db is not None:
+                    row = self._db.execute(
+                        "SELECT vector FROM embeddings WHERE namespace = ? AND text = ?", (self.namespace, text)
+                    ).fetchone()
+                    if row is not None:
+                        vector = np.frombuffer(row[0], dtype=np.float32)
+                        self._store(text, vector)
+                if vector is None:
+                    self.misses += 1
+                    continue
+                self._vectors.move_to_end(text)
+                found[text] = vector
+                self.hits += 1
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            for text, vector in vectors.items():
+                self._store(text, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (namespace, text, vector) VALUES (?, ?, ?)",
+                    [(self.namespace, text, vector.astype(np.float32).tobytes()) for text, vector in vectors.items()]
+                )
+                self._db.commit()
+
+    def _store(self, text: str, vector: np.ndarray) -> None:
+        self._vectors[text] = vector
+        self._vectors.move_to_end(text)
+        while len(self._vectors) > self.max_entries:
+            self._vectors.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._vectors),
+                'hits': self.hits,
+                'misses': self.misses,
+                'persistent': self._db is not None
+            }
+
+
+class EmbeddingClassifier:
+    """
+    Assigns search queries to interest categories by nearest-neighbour search
+    over embedding vectors, for queries the keyword lists miss.
+
+    `categories` and `personas` map a label to the text that describes it.
+    Their vectors are embedded once, on first use, into unit-normalized NumPy
+    matrices, so classifying a batch is one matrix product. A query whose
+    best cosine similarity is below `threshold` is left unclassified.
+    """
+
+    def __init__(
+        self,
+        embed: EmbedFn,
+        categories: Dict[str, str],
+        personas: Dict[str, str],
+        threshold: float = 0.5,
+        batch_size: int = 64,
+        cache: Optional[EmbeddingCache] = None):
+
+        self.embed = embed
+        self.categories = categories
+        self.personas = personas
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.cache = cache if cache is not None else EmbeddingCache()
+
+        self._category_labels = list(categories)
+        self._persona_ids = list(personas)
+        self._category_index: Optional[np.ndarray] = None
+        self._persona_index: Optional[np.ndarray] = None
+        self._index_lock = threading.Lock()
+
+    def vectors(self, texts: Sequence[str]) -> np.ndarray:
+        """Unit-length embedding for each text (rows in input order)."""
+        unique = list(dict.fromkeys(texts))
+        found = self.cache.get_many(unique)
+        missing = [t for t in unique if t not in found]
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            matrix = np.asarray(self.embed(batch), dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+            embedded = dict(zip(batch, matrix))
+            self.cache.put_many(embedded)
+            found.update(embedded)
+
+        return np.stack([found[t] for t in texts]) if texts else np.empty((0, 0), dtype=np.float32)
+
+    def _indexes(self):
+        with self._index_lock:
+            if self._category_index is None:
+                self._category_index = self.vectors([self.categories[c] for c in self._category_labels])
+                self._persona_index = self.vectors([self.personas[p] for p in self._persona_ids])
+            return self._category_index, self._persona_index
+
+    def classify(self, queries: Sequence[str]) -> List[Optional[str]]:
+        """The nearest category for each query, or None when nothing is close enough."""
+        if not queries:
+            return []
+        category_index, _ = self._indexes()
+        similarities = self.vectors(queries) @ category_index.T
+        best = similarities.argmax(axis=1)
+        best_scores = similarities[np.arange(len(queries)), best]
+        return [
+            self._category_labels[b] if score >= self.threshold else None
+            for b, score in zip(best.tolist(), best_scores.tolist())
+        ]
+
+    def count_interests(self, queries: Iterable[str]) -> Counter:
+        """Number of queries assigned to each category."""
+        return Counter(label for label in self.classify(list(queries)) if label is not None)
+
+    def personas_for_interests(self, interests: Iterable[str]) -> Set[str]:
+        """
+        Personas that would reinforce the given categories: the nearest persona
+        to each category, plus any other persona above the threshold.
+        """
+        rows = [self._category_labels.index(i) for i in interests if i in self.categories]
+        if not rows:
+            return set()
+        category_index, persona_index = self._indexes()
+        similarities = category_index[rows] @ persona_index.T
+
+        close = set(similarities.argmax(axis=1).tolist())
+        close.update(np.nonzero((similarities >= self.threshold).any(axis=0))[0].tolist())
+        return {self._persona_ids[j] for j in close}
+
+    def stats(self) -> dict:
+        return {'indexed': self._category_index is not None, 'threshold': self.threshold, 'cache': self.cache.stats()}
@@ -4,36 +4,180 @@ Combines your existing PersonaSearchRecommender with new profile analysis featur
 NOW WITH WORKING PERSONA GENERATION! ✨
 """
 
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, g
 from flask_cors import CORS
 
 import os
+import re
 import sys
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from personas_agent import PersonaSearchRecommender
+from personas_agent import PersonaSearchRecommender, PERSONAS, QUERIES_PER_PERSONA
+from keyword_matcher import KeywordMatcher
+from persona_selection import PersonaSelector
+from query_cache import QueryCache
+from query_index import QueryIndex
+from result_cache import ResultCache, content_key, raw_key
+from query_scheduler import QueryScheduler
+from query_queue import InProcessQueue, SQLiteQueue
+from sse_channels import SSEHub
+from persona_jobs import JobStoreFull, PersonaJobRunner
+from metrics import METRICS
+from llm_scheduler import BATCH, INTERACTIVE, LLMOverloaded, LLMScheduler, llm_priority, set_llm_scheduler
+from llm_parsing import parse_stats
+from timestamps import TimestampParser, hour_of_day, weekday
+from heavy_hitters import SpaceSaving
+from hyperloglog import HyperLogLog
+try:
+    from batch_analysis import BatchProfileScorer
+except ImportError:  # NumPy/SciPy not installed; batches fall back to analyze()
+    BatchProfileScorer = None
+try:
+    from distribution_metrics import distribution_changes
+except ImportError:  # NumPy not installed; comparisons skip distribution metrics
+    distribution_changes = None
+try:
+    from embedding_classifier import EmbeddingCache, EmbeddingClassifier
+except ImportError:  # NumPy not installed; interests come from keywords only
+    EmbeddingClassifier = None
+from utils import EMBEDDING_MODEL, OllamaError, embed_texts
+import copy
 import threading
-import random
 import time
-import queue
 import json
 from datetime import datetime
-from collections import Counter
-from typing import List, Dict, Any
+from collections import Counter, OrderedDict
+import uuid
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from typing import List, Dict, Any, Iterable, Optional
+
+# Set to a file path to keep generated query pools across restarts
+QUERY_CACHE_PATH = None
+
+# Approved queries are remembered so repeats and close variants (trigram
+# Jaccard similarity at or above the threshold) are neither approved again nor
+# served from generation. Set the path to keep them across restarts
+ISSUED_QUERY_INDEX_PATH = None
+NEAR_DUPLICATE_THRESHOLD = 0.7
+MAX_ISSUED_QUERIES = 10000
+
+# Set to a file path to keep approved queries in a durable SQLite queue that
+# survives restarts and is shared by every worker process on this host
+APPROVED_QUEUE_PATH = None
+
+# Background pre-generation keeps this many fresh queries ready per persona.
+# PREGENERATE_QUERIES=0 turns it off, e.g. for scripts that import this module
+PREGENERATE_QUERIES = os.environ.get('PREGENERATE_QUERIES', '1') != '0'
+RESERVOIR_LOW_WATERMARK = 10
+RESERVOIR_HIGH_WATERMARK = 30
+RESERVOIR_WORKERS = 1
+
+# Match Ollama's OLLAMA_NUM_PARALLEL so concurrent persona generation does not
+# just queue up inside the model server
+PERSONA_GENERATION_CONCURRENCY = int(os.environ.get('OLLAMA_NUM_PARALLEL', 4))
+PERSONA_GENERATION_TIMEOUT = 150  # seconds, per request
+# Ask for all personas' queries in one structured-JSON prompt instead of one
+# prompt per persona (see benchmark_batching.py)
+BATCHED_PERSONA_GENERATION = False
+
+# Every Ollama call (requests, persona jobs, reservoir refills) takes one of
+# PERSONA_GENERATION_CONCURRENCY slots, interactive before batch before
+# background. Calls beyond a class's queue limit, or waiting longer than
+# LLM_MAX_WAIT, get 503 with Retry-After; each client may make
+# LLM_CLIENT_RATE calls per second (bursts of LLM_CLIENT_BURST), else 429
+LLM_MAX_WAITING = {'interactive': 32, 'batch': 16, 'background': 4}
+LLM_MAX_WAIT = 120  # seconds
+LLM_CLIENT_RATE = 0.5
+LLM_CLIENT_BURST = 20
+
+# Events kept per SSE client for slow readers and Last-Event-ID resume
+SSE_BUFFER_SIZE = 100
+SSE_HEARTBEAT_INTERVAL = 15  # seconds
+
+# Classify queries the keyword lists miss by embedding similarity to each
+# category, and avoid personas close to the user's interests. Needs NumPy and
+# an Ollama embedding model (utils.EMBEDDING_MODEL)
+EMBEDDING_CLASSIFIER = False
+EMBEDDING_THRESHOLD = 0.5  # minimum cosine similarity
+EMBEDDING_CACHE_PATH = None  # set to a file path to keep vectors across restarts
+
+# Responses of /api/analyze-profile and /api/compare-profiles, keyed by a hash
+# of the request body, so re-sent histories and profile pairs are not recomputed
+RESULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# One JSON line per request on stdout (route, status, duration) for log shippers
+JSON_LOGS = os.environ.get('JSON_LOGS', '') == '1'
 
 app = Flask(__name__)
 CORS(app)
-recommender = PersonaSearchRecommender()
+LLM_SCHEDULER = LLMScheduler(
+    max_concurrent=PERSONA_GENERATION_CONCURRENCY,
+    max_waiting=LLM_MAX_WAITING,
+    max_wait=LLM_MAX_WAIT,
+    rate=LLM_CLIENT_RATE,
+    burst=LLM_CLIENT_BURST
+)
+set_llm_scheduler(LLM_SCHEDULER)
+query_cache = QueryCache(db_path=QUERY_CACHE_PATH)
+query_index = QueryIndex(
+    threshold=NEAR_DUPLICATE_THRESHOLD,
+    max_entries=MAX_ISSUED_QUERIES,
+    db_path=ISSUED_QUERY_INDEX_PATH
+)
+recommender = PersonaSearchRecommender(cache=query_cache, index=query_index)
+if PREGENERATE_QUERIES:
+    recommender.start_pregeneration(
+        low_watermark=RESERVOIR_LOW_WATERMARK,
+        high_watermark=RESERVOIR_HIGH_WATERMARK,
+        workers=RESERVOIR_WORKERS
+    )
+persona_executor = ThreadPoolExecutor(
+    max_workers=PERSONA_GENERATION_CONCURRENCY,
+    thread_name_prefix='persona-generation'
+)
 
 # Existing SSE functionality
-approved_queries = []
-approved_lock = threading.Lock()
-sse_clients = []
-sse_clients_lock = threading.Lock()
+approved_queries = QueryScheduler(
+    min_delay=2,
+    max_delay=5,
+    backend=SQLiteQueue(APPROVED_QUEUE_PATH) if APPROVED_QUEUE_PATH else InProcessQueue()
+)
+sse_hub = SSEHub(max_buffer=SSE_BUFFER_SIZE)
+result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_BYTES)
+
+# In-progress chunked history uploads: upload_id -> ProfileAnalyzer
+pending_uploads = OrderedDict()
+pending_uploads_lock = threading.Lock()
+
+# Analyzed histories kept around so executed queries can be folded in
+# incrementally: session_id -> {'analyzer', 'initial_profile', 'last_used'}
+profile_sessions = OrderedDict()
+profile_sessions_lock = threading.Lock()
 
 PERSONA_COUNT = 3
 CONFIDENCE_THRESHOLD = 0.6
+MAX_PENDING_UPLOADS = 100
+MAX_PROFILE_SESSIONS = 200
+PROFILE_SESSION_TTL = 24 * 60 * 60  # seconds
+MAX_PERSONA_JOBS = 500
+PERSONA_JOB_TTL = 60 * 60  # seconds a finished job's results are kept
+# Keywords match as substrings ('run' also in 'running'); True matches whole
+# words only, which is faster but misses inflected forms
+WORD_BOUNDARY_MATCHING = False
+# Common terms are counted in fixed memory: this many candidates per profile,
+# of which the top COMMON_TERMS are reported
+COMMON_TERM_CAPACITY = 200
+COMMON_TERMS = 10
+# 'unique_queries' is exact up to this many distinct queries and a
+# HyperLogLog estimate (about 1.6%) past it
+EXACT_DISTINCT_QUERIES = 10000
+# Also report the most common two-word phrases ('common_phrases')
+TRACK_BIGRAMS = False
+# Timestamps and keyword-less queries are parsed and classified this many
+# searches at a time, so a history is never held in memory whole
+ANALYZE_BATCH_SIZE = 1000
 
 CATEGORIES = {
     'technology': ['software', 'app', 'computer', 'phone', 'tech', 'coding', 'programming', 'AI', 'machine learning'],
@@ -83,6 +227,19 @@ MARITAL_PATTERNS = {
     'widowed': ['widower', 'widow', 'late husband', 'late wife']
 }
 
+# Words that carry no interest signal in a search query; they are dropped
+# before terms are counted so they never take a tracked slot
+STOPWORDS = frozenset('''
+a about after all also am an and any are as at be because been before best being between both but by
+can could did do does doing down during each few for free from get gets getting go going good got had
+has have having he her here hers him his how i if in into is it its just like make me more most much
+my near need new no nor not now of off on once one only or other our out over own per same she should
+so some such than that the their them then there these they this those through to too top under until
+up use using very vs was way we were what when where which while who whom why will with without would
+you your yours what's how's where's who's that's it's i'm don't can't
+'''.split())
+_TERM_PATTERN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
 PERSONA_MAPPINGS = {
     'outdoor_enthusiast': {'label': 'Outdoor Enthusiast', 'category': 'Active'},
     'home_cook': {'label': 'Home Cook', 'category': 'Creative'},
@@ -96,134 +253,275 @@ PERSONA_MAPPINGS = {
     'gamer': {'label': 'Gamer', 'category': 'Entertainment'}
 }
 
+# profile key -> (KEYWORD_MATCHER dimension, value key, score at which confidence reaches 1.0)
+DEMOGRAPHIC_DIMENSIONS = {
+    'age_range': ('age', 'range', 10),
+    'gender': ('gender', 'value', 5),
+    'profession': ('profession', 'field', 8),
+    'marital_status': ('marital', 'status', 5)
+}
 
-def dispatcher_thread():
-    while True:
-        wait = random.uniform(2, 5)
-        time.sleep(wait)
+KEYWORD_MATCHER = KeywordMatcher({
+    'age': AGE_PATTERNS,
+    'gender': GENDER_PATTERNS,
+    'profession': PROFESSION_PATTERNS,
+    'marital': MARITAL_PATTERNS,
+    'interests': CATEGORIES,
+}, word_boundaries=WORD_BOUNDARY_MATCHING)
 
-        with approved_lock:
-            if not approved_queries:
-                continue
-            query = approved_queries.pop(0)
+BATCH_SCORER = BatchProfileScorer(KEYWORD_MATCHER, DEMOGRAPHIC_DIMENSIONS) if BatchProfileScorer else None
 
-        event_data = json.dumps({"query": query})
+INTEREST_KEYWORDS = {
+    kw for kw, labels in KEYWORD_MATCHER.keyword_labels.items()
+    if any(dimension == 'interests' for dimension, _ in labels)
+}
 
-        with sse_clients_lock:
-            for client_queue in sse_clients:
-                client_queue.put(event_data)
+INTEREST_CLASSIFIER = None
+if EMBEDDING_CLASSIFIER and EmbeddingClassifier is not None:
+    INTEREST_CLASSIFIER = EmbeddingClassifier(
+        embed_texts,
+        {category: f"{category}: {', '.join(keywords)}" for category, keywords in CATEGORIES.items()},
+        {p['id']: f"{p['label']}: {p['description']}" for p in PERSONAS},
+        threshold=EMBEDDING_THRESHOLD,
+        cache=EmbeddingCache(db_path=EMBEDDING_CACHE_PATH, namespace=EMBEDDING_MODEL)
+    )
 
 
-thread = threading.Thread(target=dispatcher_thread, daemon=True)
-thread.start()
+def deliver_query(client_id, query: str):
+    sse_hub.publish(client_id, json.dumps({"query": query}))
 
-class ProfileAnalyzer:    
-    def __init__(self, searches: List[Dict[str, Any]]):
-        self.searches = searches
-        self.queries = [s['query'].lower() for s in searches]
-        self.all_text = ' '.join(self.queries)
 
-    @staticmethod
-    def _normalize_timestamp(ts) -> float:
+approved_queries.start(deliver_query)
+
+METRICS.describe('http_requests_total', 'counter', 'Requests by method, route and status')
+METRICS.describe('http_request_duration_seconds', 'histogram', 'Time to produce a response (not to finish streaming it)')
+METRICS.register('approved_queue_depth', 'gauge', 'Approved queries waiting for release',
+                 lambda: len(approved_queries))
+METRICS.register('sse_connections', 'gauge', 'Open /api/stream connections',
+                 lambda: sse_hub.stats()['connections'])
+METRICS.register('sse_channels', 'gauge', 'Per-client SSE channels',
+                 lambda: sse_hub.stats()['channels'])
+METRICS.register('sse_dropped_events_total', 'counter', 'Events dropped because a client fell behind',
+                 lambda: sse_hub.stats()['dropped_events'])
+METRICS.register('query_cache_lookups_total', 'counter', 'Query cache lookups by result', lambda: [
+    ({'result': 'hit'}, query_cache.stats()['hits']),
+    ({'result': 'miss'}, query_cache.stats()['misses'])
+])
+METRICS.register('query_cache_queries', 'gauge', 'Queries held in the query cache',
+                 lambda: query_cache.stats()['cached_queries'])
+METRICS.register('reservoir_depth', 'gauge', 'Pre-generated queries ready per persona', lambda: [
+    ({'persona': pid}, stats['depth']) for pid, stats in recommender.reservoir.stats().items()
+] if recommender.reservoir else [])
+METRICS.register('llm_parse_results_total', 'counter', 'LLM outputs by how they were parsed', lambda: [
+    ({'result': result}, count) for result, count in parse_stats().items()
+])
+METRICS.register('result_cache_lookups_total', 'counter', 'Cached analyze/compare responses by result', lambda: [
+    ({'result': result}, result_cache.stats()[result]) for result in ('hits', 'misses', 'not_modified')
+])
+METRICS.register('result_cache_bytes', 'gauge', 'Bytes of cached analyze/compare responses',
+                 lambda: result_cache.stats()['bytes'])
+METRICS.register('issued_queries', 'gauge', 'Queries in the issued-query index', lambda: len(query_index))
+METRICS.register('duplicate_queries_total', 'counter', 'Queries dropped as repeats of issued ones, by match', lambda: [
+    ({'match': 'exact'}, query_index.stats()['exact_duplicates']),
+    ({'match': 'near'}, query_index.stats()['near_duplicates'])
+])
+METRICS.register('llm_calls_running', 'gauge', 'Ollama calls holding a scheduler slot',
+                 lambda: LLM_SCHEDULER.stats()['running'])
+METRICS.register('llm_calls_waiting', 'gauge', 'Ollama calls queued for a slot, by priority', lambda: [
+    ({'priority': p}, n) for p, n in LLM_SCHEDULER.stats()['waiting'].items()
+])
+METRICS.register('llm_calls_admitted_total', 'counter', 'Ollama calls given a slot, by priority', lambda: [
+    ({'priority': p}, n) for p, n in LLM_SCHEDULER.stats()['admitted'].items()
+])
+METRICS.register('llm_calls_rejected_total', 'counter', 'Ollama calls refused, by priority and reason', lambda: [
+    ({'priority': r['priority'], 'reason': r['reason']}, r['count']) for r in LLM_SCHEDULER.stats()['rejected']
+])
+METRICS.register('profile_sessions', 'gauge', 'Open profile sessions', lambda: len(profile_sessions))
+METRICS.register('pending_uploads', 'gauge', 'Chunked uploads in progress', lambda: len(pending_uploads))
+if INTEREST_CLASSIFIER is not None:
+    METRICS.register('embedding_cache_lookups_total', 'counter', 'Embedding cache lookups by result', lambda: [
+        ({'result': 'hit'}, INTEREST_CLASSIFIER.cache.stats()['hits']),
+        ({'result': 'miss'}, INTEREST_CLASSIFIER.cache.stats()['misses'])
+    ])
+
+class ProfileAnalyzer:
+    """
+    Keeps only running counters over the searches it has seen, so histories can
+    be fed in with update() chunk by chunk in fixed memory whatever their
+    length: common terms are Space-Saving counters and distinct queries are
+    counted exactly up to EXACT_DISTINCT_QUERIES and with a HyperLogLog past
+    that, so 'unique_queries' is only approximate (about 1.6%) for very large
+    histories.
+    """
+
+    def __init__(self, searches: Iterable[Dict[str, Any]] = ()):
+        self.total_searches = 0
+        self.keyword_hits = Counter()
+        self.term_counts = SpaceSaving(COMMON_TERM_CAPACITY)
+        self.bigram_counts = SpaceSaving(COMMON_TERM_CAPACITY) if TRACK_BIGRAMS else None
+        self.distinct_queries = HyperLogLog(exact_limit=EXACT_DISTINCT_QUERIES)
+        self.word_count_sum = 0
+        self.question_queries = 0
+        self.specific_queries = 0
+        self.has_timestamps = None
+        self.timestamp_count = 0
+        self.earliest = None
+        self.latest = None
+        self.hour_counts = [0] * 24
+        self.weekday_counts = [0] * 7
+        # Interest categories of queries no interest keyword matched
+        self.embedded_interests = Counter()
+        self._timestamps = TimestampParser()
+        self._lock = threading.Lock()
+        self.update(searches)
+
+    def copy(self) -> 'ProfileAnalyzer':
+        """An independent analyzer with the same counts, e.g. for a new session."""
+        with self._lock:
+            state = {name: value for name, value in vars(self).items() if name != '_lock'}
+            clone = ProfileAnalyzer.__new__(ProfileAnalyzer)
+            clone.__dict__.update(copy.deepcopy(state))
+        clone._lock = threading.Lock()
+        return clone
+
+    def update(self, searches: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            raw_timestamps = []
+            unmatched = [] if INTEREST_CLASSIFIER is not None else None
+            for s in searches:
+                self._add(s, raw_timestamps, unmatched)
+                if len(raw_timestamps) >= ANALYZE_BATCH_SIZE:
+                    self._add_timestamps(self._timestamps.parse_many(raw_timestamps))
+                    raw_timestamps.clear()
+                if unmatched is not None and len(unmatched) >= ANALYZE_BATCH_SIZE:
+                    self._classify_interests(unmatched)
+                    unmatched.clear()
+            self._add_timestamps(self._timestamps.parse_many(raw_timestamps))
+            if unmatched:
+                self._classify_interests(unmatched)
+
+    def _add(self, s: Dict[str, Any], raw_timestamps: List[Any], unmatched: Optional[List[str]]) -> None:
+        query = s['query'].lower()
+        words = query.split()
+        # Original case, so acronyms like "IT" are told apart from "it"
+        found = KEYWORD_MATCHER.find(s['query'])
+
+        self.total_searches += 1
+        self.keyword_hits.update(found)
+        if unmatched is not None and found.isdisjoint(INTEREST_KEYWORDS):
+            unmatched.append(query)
+        self._count_terms(query)
+        self.distinct_queries.add(query)
+        self.word_count_sum += len(words)
+        if '?' in query:
+            self.question_queries += 1
+        if len(words) > 4:
+            self.specific_queries += 1
+
+        # Matches the old behaviour of only looking for timestamps when the
+        # first search carries one.
+        if self.has_timestamps is None:
+            self.has_timestamps = 'timestamp' in s
+        if self.has_timestamps:
+            raw_timestamps.append(s.get('timestamp', 0))
+
+    def _count_terms(self, query: str) -> None:
+        terms = [t for t in _TERM_PATTERN.findall(query)
+                 if len(t) > 2 and t not in STOPWORDS and not t.isdigit()]
+        self.term_counts.update(terms)
+        if self.bigram_counts is not None:
+            # Adjacent once stopwords are gone: "how to bake bread" -> "bake bread"
+            self.bigram_counts.update(f'{a} {b}' for a, b in zip(terms, terms[1:]))
+
+    def _add_timestamps(self, timestamps: Iterable[float]) -> None:
+        for ts in timestamps:
+            if ts <= 0:
+                continue
+            self.timestamp_count += 1
+            self.earliest = ts if self.earliest is None else min(self.earliest, ts)
+            self.latest = ts if self.latest is None else max(self.latest, ts)
+            self.hour_counts[hour_of_day(ts)] += 1
+            self.weekday_counts[weekday(ts)] += 1
+
+    def _classify_interests(self, queries: List[str]) -> None:
+        try:
+            # Someone is waiting on the analysis, so these go ahead of background
+            # work; no client id, as one history can take many embedding batches
+            with llm_priority(INTERACTIVE):
+                self.embedded_interests.update(INTEREST_CLASSIFIER.count_interests(queries))
+        except (OllamaError, ValueError, LLMOverloaded) as e:
+            print(f"⚠️ Embedding classification skipped for {len(queries)} queries: {e}")
+
+    @property
+    def embedded_scores(self) -> Dict[str, int]:
+        """
+        embedded_interests on the keyword score scale. Keyword scores count
+        distinct keywords, so they top out at the length of a category's list,
+        while embeddings count queries; a category's share of all searches is
+        scaled to its list length instead.
+        """
+        return {
+            category: round(count / self.total_searches * len(CATEGORIES[category]))
+            for category, count in self.embedded_interests.items()
+        }
+
+    @property
+    def scores(self) -> Dict[str, Dict[str, int]]:
+        scores = KEYWORD_MATCHER.score(self.keyword_hits)
+        for category, score in self.embedded_scores.items():
+            scores['interests'][category] += score
+        return scores
 
-        if isinstance(ts, (int, float)):
-            return float(ts)
-        if isinstance(ts, str):
-            try:
-                from dateutil.parser import parse as parse_dt
-                dt = parse_dt(ts)
-                return dt.timestamp() * 1000  # convert seconds → ms
-            except (ValueError, ImportError):
-                pass
-        return 0.0
-        
     def analyze(self) -> Dict[str, Any]:
+        with self._lock:
+            scores = self.scores
+            return self._build_profile(
+                {key: self._infer_demographic(scores, key) for key in DEMOGRAPHIC_DIMENSIONS},
+                self._analyze_interests(scores)
+            )
+
+    def build_profile(self, demographics: Dict[str, Any], interests: Dict[str, Any]) -> Dict[str, Any]:
+        """Profile from demographics and interests already scored elsewhere (see analyze_profiles)."""
+        with self._lock:
+            return self._build_profile(demographics, interests)
+
+    def _build_profile(self, demographics: Dict[str, Any], interests: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.total_searches:
+            raise ValueError('No searches to analyze')
         profile = {
-            'demographics': {
-                'age_range': self._infer_age(),
-                'gender': self._infer_gender(),
-                'profession': self._infer_profession(),
-                'marital_status': self._infer_marital_status()
-            },
-            'interests': self._analyze_interests(),
+            'demographics': demographics,
+            'interests': interests,
             'behavior': self._analyze_behavior(),
             'search_patterns': self._analyze_patterns(),
             'metadata': {
-                'total_searches': len(self.searches),
+                'total_searches': self.total_searches,
                 'analyzed_at': datetime.now().isoformat(),
                 'timespan': self._get_timespan()
             }
         }
         return profile
     
-    def _infer_age(self) -> Dict[str, Any]:
-        scores = {}
-        for age_range, keywords in AGE_PATTERNS.items():
-            score = sum(1 for kw in keywords if kw in self.all_text)
-            scores[age_range] = score
-        
-        if not any(scores.values()):
-            return {'range': 'unknown', 'confidence': 0.0}
-        
-        max_score = max(scores.values())
-        age_range = max(scores, key=scores.get)
-        confidence = min(max_score / 10, 1.0)
-        
-        return {'range': age_range, 'confidence': confidence, 'scores': scores}
-    
-    def _infer_gender(self) -> Dict[str, Any]:
-        scores = {}
-        for gender, keywords in GENDER_PATTERNS.items():
-            score = sum(1 for kw in keywords if kw in self.all_text)
-            scores[gender] = score
-        
-        if not any(scores.values()):
-            return {'value': 'unknown', 'confidence': 0.0}
-        
-        max_score = max(scores.values())
-        gender = max(scores, key=scores.get)
-        confidence = min(max_score / 5, 1.0)
-        
-        return {'value': gender, 'confidence': confidence, 'scores': scores}
-    
-    def _infer_profession(self) -> Dict[str, Any]:
-        scores = {}
-        for profession, keywords in PROFESSION_PATTERNS.items():
-            score = sum(1 for kw in keywords if kw in self.all_text)
-            scores[profession] = score
-        
-        if not any(scores.values()):
-            return {'field': 'unknown', 'confidence': 0.0}
-        
-        max_score = max(scores.values())
-        profession = max(scores, key=scores.get)
-        confidence = min(max_score / 8, 1.0)
-        
-        return {'field': profession, 'confidence': confidence, 'scores': scores}
-    
-    def _infer_marital_status(self) -> Dict[str, Any]:
-        scores = {}
-        for status, keywords in MARITAL_PATTERNS.items():
-            score = sum(1 for kw in keywords if kw in self.all_text)
-            scores[status] = score
+    @staticmethod
+    def _infer_demographic(all_scores: Dict[str, Dict[str, int]], key: str) -> Dict[str, Any]:
+        dimension, value_key, full_confidence_at = DEMOGRAPHIC_DIMENSIONS[key]
+        scores = dict(all_scores[dimension])
         
         if not any(scores.values()):
-            return {'status': 'unknown', 'confidence': 0.0}
+            return {value_key: 'unknown', 'confidence': 0.0}
         
         max_score = max(scores.values())
-        status = max(scores, key=scores.get)
-        confidence = min(max_score / 5, 1.0)
+        value = max(scores, key=scores.get)
+        confidence = min(max_score / full_confidence_at, 1.0)
         
-        return {'status': status, 'confidence': confidence, 'scores': scores}
+        return {value_key: value, 'confidence': confidence, 'scores': scores}
     
-    def _analyze_interests(self) -> Dict[str, Any]:
+    def _analyze_interests(self, all_scores: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
         interests = {}
-        for category, keywords in CATEGORIES.items():
-            count = sum(1 for kw in keywords if kw in self.all_text)
+        for category, count in all_scores['interests'].items():
             if count > 0:
                 interests[category] = {
                     'count': count,
-                    'percentage': (count / len(self.queries)) * 100
+                    'percentage': (count / self.total_searches) * 100
                 }
         
         sorted_interests = dict(sorted(interests.items(), key=lambda x: x[1]['count'], reverse=True))
@@ -231,51 +529,46 @@ class ProfileAnalyzer:
     
     def _analyze_behavior(self) -> Dict[str, Any]:
         return {
-            'avg_query_length': sum(len(q.split()) for q in self.queries) / len(self.queries),
-            'question_queries': sum(1 for q in self.queries if '?' in q),
+            'avg_query_length': self.word_count_sum / self.total_searches,
+            'question_queries': self.question_queries,
             'specific_vs_broad': self._classify_specificity(),
             'temporal_patterns': self._analyze_temporal()
         }
     
     def _classify_specificity(self) -> Dict[str, int]:
-        specific = sum(1 for q in self.queries if len(q.split()) > 4)
-        return {'specific': specific, 'broad': len(self.queries) - specific}
+        specific = self.specific_queries
+        return {'specific': specific, 'broad': self.total_searches - specific}
     
     def _analyze_temporal(self) -> Dict[str, Any]:
-        if not self.searches or 'timestamp' not in self.searches[0]:
-            return {'available': False}
-        timestamps = [self._normalize_timestamp(s.get('timestamp', 0)) for s in self.searches]
-        timestamps = [t for t in timestamps if t > 0]
-        if len(timestamps) < 2:
+        if self.timestamp_count < 2:
             return {'available': False}
         return {
             'available': True,
-            'earliest': min(timestamps),
-            'latest': max(timestamps),
-            'span_days': (max(timestamps) - min(timestamps)) / (1000 * 60 * 60 * 24)
+            'earliest': self.earliest,
+            'latest': self.latest,
+            'span_days': (self.latest - self.earliest) / (1000 * 60 * 60 * 24),
+            'timestamp_format': self._timestamps.format,
+            # UTC; hour 0-23 and weekday Monday=0
+            'hour_of_day': list(self.hour_counts),
+            'weekday': list(self.weekday_counts)
         }
     
     def _analyze_patterns(self) -> Dict[str, Any]:
-        words = []
-        for query in self.queries:
-            words.extend(query.split())
-        word_freq = Counter(words)
-        common_words = [w for w, _ in word_freq.most_common(20) 
-                       if len(w) > 3 and w not in ['what', 'where', 'when', 'how', 'the']]
-        return {
-            'common_terms': common_words[:10],
-            'unique_queries': len(set(self.queries)),
-            'repeated_queries': len(self.queries) - len(set(self.queries))
+        # The estimate can overshoot slightly; there are never more unique queries than searches
+        unique = min(len(self.distinct_queries), self.total_searches)
+        patterns = {
+            'common_terms': [term for term, _ in self.term_counts.top(COMMON_TERMS)],
+            'unique_queries': unique,
+            'repeated_queries': self.total_searches - unique
         }
+        if self.bigram_counts is not None:
+            patterns['common_phrases'] = [phrase for phrase, _ in self.bigram_counts.top(COMMON_TERMS)]
+        return patterns
     
     def _get_timespan(self) -> str:
-        if not self.searches or 'timestamp' not in self.searches[0]:
-            return 'unknown'
-        timestamps = [self._normalize_timestamp(s.get('timestamp', 0)) for s in self.searches]
-        timestamps = [t for t in timestamps if t > 0]
-        if len(timestamps) < 2:
+        if self.timestamp_count < 2:
             return 'unknown'
-        span_days = (max(timestamps) - min(timestamps)) / (1000 * 60 * 60 * 24)
+        span_days = (self.latest - self.earliest) / (1000 * 60 * 60 * 24)
         if span_days < 7:
             return f'{int(span_days)} days'
         elif span_days < 30:
@@ -284,6 +577,29 @@ class ProfileAnalyzer:
             return f'{int(span_days / 30)} months'
 
 
+def analyze_profiles(histories: List[Iterable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Profiles for many search histories, identical to analyzing each one on its
+    own. Demographics and interests for the whole batch are scored with
+    sparse matrix operations when NumPy/SciPy are available.
+    """
+    analyzers = [ProfileAnalyzer(history) for history in histories]
+    for i, analyzer in enumerate(analyzers):
+        if not analyzer.total_searches:
+            raise ValueError(f'No searches to analyze in history {i}')
+
+    if BATCH_SCORER is None:
+        return [analyzer.analyze() for analyzer in analyzers]
+
+    scored = BATCH_SCORER.score(
+        [analyzer.keyword_hits for analyzer in analyzers],
+        [analyzer.total_searches for analyzer in analyzers],
+        [analyzer.embedded_scores for analyzer in analyzers]
+    )
+    return [analyzer.build_profile(demographics, interests)
+            for analyzer, (demographics, interests) in zip(analyzers, scored)]
+
+
 class ProfileComparator:
     
     def __init__(self, initial_profile: Dict[str, Any], updated_profile: Dict[str, Any]):
@@ -291,14 +607,37 @@ class ProfileComparator:
         self.updated = updated_profile
     
     def compare(self) -> Dict[str, Any]:
+        distributions = distribution_changes(self.initial, [self.updated])[0] if distribution_changes else None
+        return self._compare(distributions)
+
+    @classmethod
+    def compare_series(cls, initial_profile: Dict[str, Any], updated_profiles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        compare() for one baseline against a time series of updated profiles,
+        e.g. for a progress chart. Distribution metrics for the whole series
+        are computed in one vectorized pass.
+        """
+        if distribution_changes and updated_profiles:
+            distributions = distribution_changes(initial_profile, updated_profiles)
+        else:
+            distributions = [None] * len(updated_profiles)
+        return [cls(initial_profile, updated)._compare(d) for updated, d in zip(updated_profiles, distributions)]
+
+    def _compare(self, distributions: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Each component once; the summary reuses them
+        demographic_changes = self._compare_demographics()
+        interest_changes = self._compare_interests()
+        obfuscation_score = self._calculate_obfuscation_score()
         comparison = {
-            'demographic_changes': self._compare_demographics(),
-            'interest_changes': self._compare_interests(),
+            'demographic_changes': demographic_changes,
+            'interest_changes': interest_changes,
             'confidence_deltas': self._calculate_confidence_deltas(),
-            'obfuscation_score': self._calculate_obfuscation_score(),
-            'summary': self._generate_summary(),
+            'obfuscation_score': obfuscation_score,
+            'summary': self._generate_summary(demographic_changes, interest_changes, obfuscation_score),
             'compared_at': datetime.now().isoformat()
         }
+        if distributions is not None:
+            comparison['distribution_changes'] = distributions
         return comparison
     
     def _compare_demographics(self) -> Dict[str, Any]:
@@ -361,10 +700,8 @@ class ProfileComparator:
         obfuscation_score = sum(scores) / len(scores) if scores else 0
         return round(obfuscation_score * 100, 2)
     
-    def _generate_summary(self) -> Dict[str, Any]:
-        demo_changes = self._compare_demographics()
-        interest_changes = self._compare_interests()
-        obfuscation = self._calculate_obfuscation_score()
+    def _generate_summary(self, demo_changes: Dict[str, Any], interest_changes: Dict[str, Any],
+                          obfuscation: float) -> Dict[str, Any]:
         changed_count = sum(1 for v in demo_changes.values() if v.get('changed', False))
         
         return {
@@ -385,10 +722,30 @@ class ProfileComparator:
             return "Low obfuscation. More queries needed to effectively obscure your profile."
 
 
+def _known_persona_queries(persona_id: str) -> List[str]:
+    queries = recommender.known_queries(persona_id)
+    if queries:
+        return queries
+    # Nothing generated yet: the persona's description topics stand in for its queries
+    persona = next(p for p in PERSONAS if p['id'] == persona_id)
+    return [topic.strip() for topic in persona['description'].split(',')]
+
+
+PERSONA_SELECTOR = PersonaSelector(
+    KEYWORD_MATCHER,
+    DEMOGRAPHIC_DIMENSIONS,
+    _known_persona_queries,
+    lambda initial, updated: ProfileComparator(initial, updated)._calculate_obfuscation_score(),
+    queries_per_persona=QUERIES_PER_PERSONA
+)
+
+
 def select_inverse_personas(profile: Dict[str, Any], count: int = 3) -> List[str]:
     """
     Select persona IDs that are INVERSE/OPPOSITE to the user's profile
     This ensures the generated queries will obfuscate the user's actual interests
+    Among the personas left, PERSONA_SELECTOR picks the set predicted to dilute
+    the profile most per executed query
     """
     top_interests = profile.get('interests', {}).get('top_interests', [])
     
@@ -408,6 +765,13 @@ def select_inverse_personas(profile: Dict[str, Any], count: int = 3) -> List[str
     for interest in top_interests:
         if interest in interest_to_persona:
             avoid_personas.add(interest_to_persona[interest])
+
+    if INTEREST_CLASSIFIER is not None:
+        try:
+            with llm_priority(INTERACTIVE):
+                avoid_personas |= INTEREST_CLASSIFIER.personas_for_interests(top_interests)
+        except (OllamaError, ValueError, LLMOverloaded) as e:
+            print(f"⚠️ Embedding persona matching skipped: {e}")
     
     all_persona_ids = list(PERSONA_MAPPINGS.keys())
     
@@ -416,12 +780,53 @@ def select_inverse_personas(profile: Dict[str, Any], count: int = 3) -> List[str
     if len(inverse_personas) < count:
         inverse_personas = all_persona_ids
     
-    selected = random.sample(inverse_personas, min(count, len(inverse_personas)))
+    return PERSONA_SELECTOR.select(profile, inverse_personas, count)
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    # The rule, not the path, so session ids do not explode the label set
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    record_request(request.method, route, request.path, response.status_code, time.perf_counter() - started)
+    return response
 
-    return selected
 
+def record_request(method: str, route: str, path: str, status: int, duration: float) -> None:
+    METRICS.inc('http_requests_total', method=method, route=route, status=status)
+    METRICS.observe('http_request_duration_seconds', duration, method=method, route=route)
+    if JSON_LOGS:
+        print(json.dumps({
+            'ts': datetime.now().isoformat(),
+            'method': method,
+            'route': route,
+            'path': path,
+            'status': status,
+            'duration_ms': round(duration * 1000, 2)
+        }), flush=True)
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _client_id() -> str:
+    """Identify the caller so cached queries are never handed to the same client twice."""
+    return request.headers.get("X-Client-Id") or request.args.get("client_id") or request.remote_addr
+
+
+def _overloaded_response(e: LLMOverloaded):
+    status = 429 if e.reason == 'rate_limited' else 503
+    return jsonify({'success': False, 'error': str(e)}), status, {'Retry-After': str(int(e.retry_after))}
+
 
 @app.route("/api/recommendations", methods=["GET"])
 def get_recommendations():
@@ -429,11 +834,15 @@ def get_recommendations():
     if not persona_id:
         return jsonify({"error": "Missing required query parameter: persona_id"}), 400
 
+    client_id = _client_id()
     try:
-        queries = recommender.get_search_query_recommendations(persona_id)
+        with llm_priority(INTERACTIVE, client_id):
+            queries = recommender.get_search_query_recommendations(persona_id, client_id=client_id)
         return jsonify({"persona_id": persona_id, "queries": queries})
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
+    except LLMOverloaded as e:
+        return _overloaded_response(e)
     except RuntimeError as e:
         return jsonify({"error": str(e)}), 500
 
@@ -448,30 +857,48 @@ def approve_queries():
     if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
         return jsonify({"error": "'queries' must be a list of strings"}), 400
 
-    with approved_lock:
-        approved_queries.extend(queries)
+    # Queries go only to the approving client's streams unless broadcast is requested
+    client_id = _client_id()
+    target = None if data.get("broadcast") else client_id
+    # Repeats of queries this client already issued add no new signal; drop them
+    fresh = query_index.add(queries, client_id)
+    total_queued = approved_queries.schedule(fresh, client_id=target)
 
     return jsonify({
-        "message": f"{len(queries)} queries approved and queued.",
-        "total_queued": len(approved_queries)
+        "message": f"{len(fresh)} queries approved and queued.",
+        "total_queued": total_queued,
+        "duplicates_skipped": len(queries) - len(fresh)
     })
 
 
 @app.route("/api/stream", methods=["GET"])
 def stream():
-    client_queue = queue.Queue()
+    client_id = _client_id()
+    channel = sse_hub.connect(client_id)
 
-    with sse_clients_lock:
-        sse_clients.append(client_queue)
+    # Resume after the last event the client saw; fresh connections only get new events
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        cursor = int(last_event_id)
+    except (TypeError, ValueError):
+        cursor = channel.latest_id
 
     def event_stream():
+        nonlocal cursor
         try:
+            yield "retry: 3000\n\n"
             while True:
-                data = client_queue.get()
-                yield f"data: {data}\n\n"
-        except GeneratorExit:
-            with sse_clients_lock:
-                sse_clients.remove(client_queue)
+                events = channel.read(cursor, timeout=SSE_HEARTBEAT_INTERVAL)
+                if not events:
+                    # Comment line keeps proxies open and surfaces dead connections
+                    yield ": heartbeat\n\n"
+                    continue
+                for event_id, data, event in events:
+                    name = f"event: {event}\n" if event else ""
+                    yield f"id: {event_id}\n{name}data: {data}\n\n"
+                    cursor = event_id
+        finally:
+            sse_hub.disconnect(client_id)
 
     return Response(event_stream(), mimetype="text/event-stream", headers={
         "Cache-Control": "no-cache",
@@ -479,34 +906,356 @@ def stream():
     })
 
 
+@app.route('/api/reservoir', methods=['GET'])
+def reservoir_stats():
+    if recommender.reservoir is None:
+        return jsonify({'enabled': False})
+    return jsonify({
+        'enabled': True,
+        'low_watermark': recommender.reservoir.low_watermark,
+        'high_watermark': recommender.reservoir.high_watermark,
+        'personas': recommender.reservoir.stats()
+    })
+
+
+@app.route('/api/llm-scheduler', methods=['GET'])
+def llm_scheduler_stats():
+    return jsonify(LLM_SCHEDULER.stats())
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
 
+def _cached_response(namespace: str, compute):
+    """
+    Serve a POST from result_cache. The ETag is the content key of the body,
+    so a matching If-None-Match gets 304; a client re-sending the same bytes
+    is answered without parsing them. `compute(data)` returns (view result,
+    meta) and only 200 responses are stored.
+    """
+    raw = raw_key(namespace, request.get_data())
+    key = result_cache.alias(raw)
+    if key is None:
+        data = request.get_json(silent=True)
+        key = content_key(namespace, data)
+    else:
+        data = None
+
+    if request.if_none_match.contains(key):
+        result_cache.record('not_modified')
+        return Response(status=304, headers={'ETag': f'"{key}"'})
+    entry = result_cache.get(key)
+    if entry is not None:
+        result_cache.record('hit')
+        result_cache.put(key, entry[0], entry[1], raw)
+        return Response(entry[0], mimetype='application/json', headers={'ETag': f'"{key}"'})
+
+    result_cache.record('miss')
+    if data is None:
+        data = request.get_json(silent=True)
+    rv, meta = compute(data)
+    response = app.make_response(rv)
+    if response.status_code == 200:
+        response.headers['ETag'] = f'"{key}"'
+        result_cache.put(key, response.get_data(), meta, raw)
+    return response
+
+
 @app.route('/api/analyze-profile', methods=['POST'])
 def analyze_profile():
+    """
+    Only the analysis is kept in result_cache (the profile and the analyzer
+    it came from); every response opens its own session on a copy of that
+    analyzer, so clients sending the same history never share a session.
+    """
     try:
-        data = request.json
-        searches = data.get('searches', [])
-        
-        if not searches:
-            return jsonify({'error': 'No search history provided'}), 400
-        
-        print(f"📊 Analyzing {len(searches)} searches...")
-        
-        analyzer = ProfileAnalyzer(searches)
-        profile = analyzer.analyze()
+        raw = raw_key('analyze-profile', request.get_data())
+        key = result_cache.alias(raw)
+        data = None
+        if key is None:
+            data = request.get_json(silent=True)
+            key = content_key('analyze-profile', data)
+
+        entry = result_cache.get(key)
+        if entry is not None:
+            result_cache.record('hit')
+            result_cache.put(key, entry[0], entry[1], raw)
+            profile = json.loads(entry[0])
+            analyzer = entry[1].copy()
+        else:
+            result_cache.record('miss')
+            if data is None:
+                data = request.get_json(silent=True)
+            searches = data.get('searches', [])
+            
+            if not searches:
+                return jsonify({'error': 'No search history provided'}), 400
+            
+            print(f"📊 Analyzing {len(searches)} searches...")
+            
+            analyzer = ProfileAnalyzer(searches)
+            profile = analyzer.analyze()
+            # The cached analyzer is never updated itself, only copied
+            result_cache.put(key, json.dumps(profile).encode(), analyzer, raw)
+            analyzer = analyzer.copy()
+
+        session_id = _open_profile_session(analyzer, profile)
         
         print(f"Profile generated! Top interests: {profile['interests']['top_interests']}")
         
-        return jsonify({'success': True, 'profile': profile})
+        return jsonify({'success': True, 'profile': profile, 'session_id': session_id})
         
     except Exception as e:
         print(f"Error in analyze_profile: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/analyze-profiles', methods=['POST'])
+def analyze_profiles_bulk():
+    """
+    Analyze many histories in one request. `histories` is either a list of
+    search lists or an object mapping user ids to search lists; profiles come
+    back in the same shape. No profile sessions are opened.
+    """
+    try:
+        data = request.json
+        histories = data.get('histories')
+
+        if isinstance(histories, dict):
+            keys = list(histories)
+            values = [histories[k] for k in keys]
+        elif isinstance(histories, list):
+            keys = None
+            values = histories
+        else:
+            return jsonify({'error': 'histories must be a list or an object of search lists'}), 400
+
+        if not values:
+            return jsonify({'error': 'No histories provided'}), 400
+        for i, searches in enumerate(values):
+            if not isinstance(searches, list) or not searches:
+                name = keys[i] if keys else i
+                return jsonify({'error': f'No search history provided for {name}'}), 400
+
+        print(f"📊 Analyzing {len(values)} histories ({sum(len(v) for v in values)} searches)...")
+
+        profiles = analyze_profiles(values)
+        if keys is not None:
+            profiles = dict(zip(keys, profiles))
+
+        return jsonify({'success': True, 'profiles': profiles, 'count': len(values)})
+
+    except Exception as e:
+        print(f"Error in analyze_profiles_bulk: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def _open_profile_session(analyzer: ProfileAnalyzer, profile: Dict[str, Any]) -> str:
+    session_id = uuid.uuid4().hex
+    profile['metadata']['session_id'] = session_id
+    now = time.time()
+
+    with profile_sessions_lock:
+        profile_sessions[session_id] = {
+            'analyzer': analyzer,
+            'initial_profile': profile,
+            'last_used': now
+        }
+        while profile_sessions:
+            oldest_id, oldest = next(iter(profile_sessions.items()))
+            if len(profile_sessions) <= MAX_PROFILE_SESSIONS and now - oldest['last_used'] < PROFILE_SESSION_TTL:
+                break
+            del profile_sessions[oldest_id]
+
+    return session_id
+
+
+def _get_profile_session(session_id: str):
+    with profile_sessions_lock:
+        session = profile_sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session['last_used'] >= PROFILE_SESSION_TTL:
+            del profile_sessions[session_id]
+            return None
+        session['last_used'] = time.time()
+        profile_sessions.move_to_end(session_id)
+        return session
+
+
+def _iter_ndjson_searches(stream):
+    """Yield search dicts from an NDJSON body; a line may also hold a JSON array of searches."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, list):
+            yield from item
+        else:
+            yield item
+
+
+@app.route('/api/analyze-profile/stream', methods=['POST'])
+def analyze_profile_stream():
+    try:
+        analyzer = ProfileAnalyzer()
+        analyzer.update(_iter_ndjson_searches(request.stream))
+
+        if not analyzer.total_searches:
+            return jsonify({'error': 'No search history provided'}), 400
+
+        print(f"📊 Analyzed {analyzer.total_searches} streamed searches")
+
+        profile = analyzer.analyze()
+        session_id = _open_profile_session(analyzer, profile)
+        return jsonify({'success': True, 'profile': profile, 'session_id': session_id})
+
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        return jsonify({'success': False, 'error': f'Invalid NDJSON search history: {e}'}), 400
+    except Exception as e:
+        print(f"Error in analyze_profile_stream: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/analyze-profile/chunks', methods=['POST'])
+def analyze_profile_chunk():
+    try:
+        data = request.json
+        upload_id = data.get('upload_id')
+        searches = data.get('searches', [])
+        done = data.get('done', False)
+
+        with pending_uploads_lock:
+            if upload_id is None:
+                upload_id = uuid.uuid4().hex
+                pending_uploads[upload_id] = ProfileAnalyzer()
+                while len(pending_uploads) > MAX_PENDING_UPLOADS:
+                    pending_uploads.popitem(last=False)
+            analyzer = pending_uploads.get(upload_id)
+            if analyzer is None:
+                return jsonify({'error': f"Unknown upload_id '{upload_id}'"}), 404
+            pending_uploads.move_to_end(upload_id)
+            if done:
+                del pending_uploads[upload_id]
+
+        analyzer.update(searches)
+
+        if not done:
+            return jsonify({
+                'success': True,
+                'upload_id': upload_id,
+                'received': analyzer.total_searches
+            })
+
+        if not analyzer.total_searches:
+            return jsonify({'error': 'No search history provided'}), 400
+
+        print(f"📊 Analyzed {analyzer.total_searches} searches from chunked upload {upload_id}")
+
+        profile = analyzer.analyze()
+        session_id = _open_profile_session(analyzer, profile)
+        return jsonify({
+            'success': True,
+            'upload_id': upload_id,
+            'profile': profile,
+            'session_id': session_id
+        })
+
+    except (KeyError, TypeError) as e:
+        return jsonify({'success': False, 'error': f'Invalid search history chunk: {e}'}), 400
+    except Exception as e:
+        print(f"Error in analyze_profile_chunk: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/profile-sessions/<session_id>/searches', methods=['POST'])
+def update_profile_session(session_id):
+    try:
+        data = request.json
+        searches = data.get('searches', [])
+
+        if not isinstance(searches, list) or not all(
+                isinstance(s, dict) and isinstance(s.get('query'), str) for s in searches):
+            return jsonify({'error': "'searches' must be a list of {query, timestamp} objects"}), 400
+
+        session = _get_profile_session(session_id)
+        if session is None:
+            return jsonify({'error': f"Unknown or expired session '{session_id}'"}), 404
+
+        analyzer = session['analyzer']
+        analyzer.update(searches)
+        profile = analyzer.analyze()
+        profile['metadata']['session_id'] = session_id
+
+        comparison = ProfileComparator(session['initial_profile'], profile).compare()
+
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'added': len(searches),
+            'profile': profile,
+            'comparison': comparison
+        })
+
+    except Exception as e:
+        print(f"Error in update_profile_session: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def build_persona(i: int, persona_id: str, queries: List[str]) -> Dict[str, Any]:
+    persona_info = PERSONA_MAPPINGS.get(persona_id, {
+        'label': f'Persona {i+1}',
+        'category': 'General'
+    })
+    
+    return {
+        'id': f'persona_{i + 1}',
+        'persona_id': persona_id,
+        'title': persona_info['label'],
+        'description': f"Queries generated to obfuscate your profile with {persona_info['label'].lower()} interests",
+        'demographics': {
+            'age_range': 'varied',
+            'gender': 'varied',
+            'profession': 'varied',
+            'marital_status': 'varied'
+        },
+        'interests': [persona_id],
+        'queries': queries,
+        'category': persona_info['category'],
+        'created_at': datetime.now().isoformat()
+    }
+
+
+def _generate_persona_group(persona_ids: List[str], client_id: str) -> Dict[str, List[str]]:
+    # Runs at batch priority: persona_jobs submits it through LLM_SCHEDULER
+    if len(persona_ids) == 1:
+        return {persona_ids[0]: recommender.get_search_query_recommendations(persona_ids[0], client_id=client_id)}
+    return recommender.get_batch_recommendations(persona_ids, client_id=client_id)
+
+
+persona_jobs = PersonaJobRunner(
+    persona_executor,
+    LLM_SCHEDULER,
+    _generate_persona_group,
+    build_persona,
+    lambda client_id, event, payload: sse_hub.publish(client_id, json.dumps(payload), event),
+    timeout=PERSONA_GENERATION_TIMEOUT,
+    max_jobs=MAX_PERSONA_JOBS,
+    ttl=PERSONA_JOB_TTL
+)
+
+
+def _persona_job_counts():
+    stats = persona_jobs.stats()
+    return [({'state': 'running'}, stats['running']), ({'state': 'finished'}, stats['jobs'] - stats['running'])]
+
+
+METRICS.register('persona_jobs', 'gauge', 'Persona generation jobs held, by state', _persona_job_counts)
+
+
 @app.route('/api/generate-personas', methods=['POST'])
 def generate_personas():
     try:
@@ -519,51 +1268,74 @@ def generate_personas():
         
         print(f"🎭 Generating {count} inverse personas...")
         
+        # Shed at once rather than queue behind a full batch queue
+        LLM_SCHEDULER.check(BATCH)
+
         # Select inverse persona IDs based on user's profile
         selected_persona_ids = select_inverse_personas(profile, count)
+        client_id = _client_id()
+        
+        # Generate every persona's queries concurrently; the shared executor
+        # caps how many LLM calls run at once across all requests.
+        # Tasks still queued on the executor count as waiting batch calls, so
+        # a backlog there is shed with 503 instead of timing out later
+        if BATCHED_PERSONA_GENERATION:
+            print(f"  ⚙️  Generating queries for personas: {', '.join(selected_persona_ids)}")
+            (batch,) = LLM_SCHEDULER.submit(persona_executor, BATCH, client_id, [
+                partial(recommender.get_batch_recommendations, selected_persona_ids, client_id=client_id)
+            ])
+            futures = [batch] * len(selected_persona_ids)
+        else:
+            for persona_id in selected_persona_ids:
+                print(f"  ⚙️  Generating queries for persona: {persona_id}")
+            futures = LLM_SCHEDULER.submit(persona_executor, BATCH, client_id, [
+                partial(recommender.get_search_query_recommendations, persona_id, client_id=client_id)
+                for persona_id in selected_persona_ids
+            ])
+        deadline = time.monotonic() + PERSONA_GENERATION_TIMEOUT
         
         personas = []
-        for i, persona_id in enumerate(selected_persona_ids):
-            print(f"  ⚙️  Generating queries for persona: {persona_id}")
-            
+        failed_personas = []
+        overloaded = []
+        for i, (persona_id, future) in enumerate(zip(selected_persona_ids, futures)):
             try:
-                queries = recommender.get_search_query_recommendations(persona_id)
+                queries = future.result(timeout=max(0, deadline - time.monotonic()))
+                if BATCHED_PERSONA_GENERATION:
+                    queries = queries[persona_id]
                 print(f"Generated {len(queries)} queries for {persona_id}")
+            except (FutureTimeoutError, CancelledError):
+                print(f"Timed out generating queries for {persona_id}")
+                # Nobody will read the result; free the worker if it has not started
+                future.cancel()
+                queries = []
+                failed_personas.append(persona_id)
+            except LLMOverloaded as e:
+                print(f"Shed generating queries for {persona_id}: {e}")
+                queries = []
+                failed_personas.append(persona_id)
+                overloaded.append(e)
             except Exception as e:
                 print(f"Error generating queries for {persona_id}: {e}")
                 queries = []
+                failed_personas.append(persona_id)
             
-            persona_info = PERSONA_MAPPINGS.get(persona_id, {
-                'label': f'Persona {i+1}',
-                'category': 'General'
-            })
-            
-            persona = {
-                'id': f'persona_{i + 1}',
-                'persona_id': persona_id,
-                'title': persona_info['label'],
-                'description': f"Queries generated to obfuscate your profile with {persona_info['label'].lower()} interests",
-                'demographics': {
-                    'age_range': 'varied',
-                    'gender': 'varied',
-                    'profession': 'varied',
-                    'marital_status': 'varied'
-                },
-                'interests': [persona_id],
-                'queries': queries,
-                'category': persona_info['category'],
-                'created_at': datetime.now().isoformat()
-            }
+            persona = build_persona(i, persona_id, queries)
             personas.append(persona)
         
+        if overloaded and len(overloaded) == len(selected_persona_ids):
+            return _overloaded_response(max(overloaded, key=lambda e: e.retry_after))
+
         print(f"Successfully generated {len(personas)} personas with queries!")
         
         return jsonify({
             'success': True,
             'personas': personas,
-            'count': len(personas)
+            'count': len(personas),
+            'failed_personas': failed_personas
         })
         
+    except LLMOverloaded as e:
+        return _overloaded_response(e)
     except Exception as e:
         print(f"Error in generate_personas: {str(e)}")
         import traceback
@@ -571,12 +1343,68 @@ def generate_personas():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/persona-jobs', methods=['POST'])
+def submit_persona_job():
+    """
+    /api/generate-personas without waiting: returns a job id at once. Poll
+    /api/persona-jobs/<job_id>, or listen on /api/stream with the same client
+    id for a 'persona' event per persona and a final 'job' event.
+    """
+    try:
+        data = request.json
+        profile = data.get('profile', {})
+        count = data.get('count', PERSONA_COUNT)
+
+        if not profile:
+            return jsonify({'error': 'No profile provided'}), 400
+
+        LLM_SCHEDULER.check(BATCH)
+        selected_persona_ids = select_inverse_personas(profile, count)
+        client_id = _client_id()
+        job = persona_jobs.submit(selected_persona_ids, client_id, batched=BATCHED_PERSONA_GENERATION)
+
+        print(f"🎭 Persona job {job.id}: generating {', '.join(selected_persona_ids)}")
+
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': f'/api/persona-jobs/{job.id}',
+            'persona_ids': selected_persona_ids,
+            'client_id': client_id
+        }), 202
+
+    except JobStoreFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except LLMOverloaded as e:
+        return _overloaded_response(e)
+    except Exception as e:
+        print(f"Error in submit_persona_job: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/persona-jobs/<job_id>', methods=['GET'])
+def persona_job_status(job_id):
+    job = persona_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    return jsonify({'success': True, **job})
+
+
 @app.route('/api/compare-profiles', methods=['POST'])
 def compare_profiles():
+    return _cached_response('compare-profiles', lambda data: (_compare_profiles(data), None))
+
+
+def _compare_profiles(data):
     try:
-        data = request.json
         initial_profile = data.get('initialProfile', {})
         updated_profile = data.get('updatedProfile', {})
+        updated_profiles = data.get('updatedProfiles')
+
+        # A list of updated profiles (oldest first) compares each against the baseline
+        if initial_profile and isinstance(updated_profiles, list) and updated_profiles:
+            comparisons = ProfileComparator.compare_series(initial_profile, updated_profiles)
+            return jsonify({'success': True, 'comparisons': comparisons})
         
         if not initial_profile or not updated_profile:
             return jsonify({'error': 'Both profiles required'}), 400
@@ -616,11 +1444,19 @@ def home():
         "endpoints": {
             "health": "/health",
             "analyze": "/api/analyze-profile",
+            "analyze_stream": "/api/analyze-profile/stream",
+            "analyze_chunks": "/api/analyze-profile/chunks",
+            "analyze_batch": "/api/analyze-profiles",
+            "profile_session": "/api/profile-sessions/<session_id>/searches",
             "personas": "/api/generate-personas",
+            "persona_jobs": "/api/persona-jobs",
             "compare": "/api/compare-profiles",
             "recommendations": "/api/recommendations",
             "approve": "/api/approve",
             "stream": "/api/stream",
+            "reservoir": "/api/reservoir",
+            "llm_scheduler": "/api/llm-scheduler",
+            "metrics": "/metrics",
             "export": "/api/export-data"
         }
     })
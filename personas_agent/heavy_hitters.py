@@ -0,0 +1,65 @@
+import heapq
+from typing import Dict, Iterable, List, Tuple
+
+
+class SpaceSaving:
+    """
+    Approximate most frequent items of a stream in fixed memory (the
+    Space-Saving algorithm of Metwally et al.).
+
+    At most `capacity` items are tracked. An untracked item replaces the one
+    with the lowest count and inherits that count plus one, so counts can
+    only be overestimated, by at most (items seen) / capacity. Any item
+    occurring more often than that is guaranteed to be tracked, which keeps
+    the top few stable when capacity is well above how many are reported.
+
+    Increments of tracked items are a dict update. The min-heap holds one
+    entry per item with a count that may be stale (never above the real
+    one) and is only fixed up when an item has to be replaced.
+    """
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self.total = 0
+        # item -> [count, overestimate]
+        self._counts: Dict[str, List[int]] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, item: str) -> None:
+        self.total += 1
+        entry = self._counts.get(item)
+        if entry is not None:
+            entry[0] += 1
+            return
+        if len(self._counts) < self.capacity:
+            self._counts[item] = [1, 0]
+            heapq.heappush(self._heap, (1, item))
+            return
+
+        # Pop until the top's count is current; it is then the true minimum
+        while True:
+            count, evicted = self._heap[0]
+            actual = self._counts[evicted][0]
+            if actual == count:
+                break
+            heapq.heapreplace(self._heap, (actual, evicted))
+        del self._counts[evicted]
+        self._counts[item] = [count + 1, count]
+        heapq.heapreplace(self._heap, (count + 1, item))
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        """The k items with the highest counts, ties in alphabetical order."""
+        ranked = heapq.nsmallest(k, self._counts.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        return [(item, count) for item, (count, _) in ranked]
+
+    def error(self, item: str) -> int:
+        """How much the item's count may be overestimated by (0 if untracked)."""
+        entry = self._counts.get(item)
+        return entry[1] if entry is not None else 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
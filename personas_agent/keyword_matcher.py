@@ -0,0 +1,90 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Set
+
+_WORD = re.compile(r'\w+')
+
+
+class KeywordMatcher:
+    """
+    Matches every keyword of every pattern table in a single pass per text.
+
+    `tables` maps a dimension name (e.g. 'age') to a {label: [keywords]} dict,
+    the same shape as AGE_PATTERNS, CATEGORIES, etc.
+
+    With word boundaries (the default) a text is split into words once and
+    each run of up to as many words as the longest keyword is looked up in a
+    dict, so the cost does not depend on how many keywords there are. Longer
+    keywords also tolerate a plural "s" ("games", "recipes"). All-caps
+    acronyms such as "IT" or "AI" only match in capitals, so the pronoun
+    "it" is not read as a profession. Without word boundaries every keyword
+    is a plain substring test on the lowercased text.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, List[str]]], word_boundaries: bool = True):
+        self.tables = tables
+        self.word_boundaries = word_boundaries
+
+        # keyword -> [(dimension, label), ...]
+        self.keyword_labels: Dict[str, List[tuple]] = {}
+        for dimension, table in tables.items():
+            for label, keywords in table.items():
+                for kw in keywords:
+                    key = kw if self._is_acronym(kw) else kw.lower()
+                    self.keyword_labels.setdefault(key, []).append((dimension, label))
+
+        # Space-joined lowercase words -> keyword; acronyms by their original case
+        self._ngrams: Dict[str, str] = {}
+        self._acronyms: Dict[str, str] = {}
+        for kw in self.keyword_labels:
+            table = self._acronyms if self._is_acronym(kw) else self._ngrams
+            table[' '.join(_WORD.findall(kw))] = kw
+        # Plurals second, so they never shadow a keyword of their own
+        for kw in self.keyword_labels:
+            if len(kw) > 3 and not self._is_acronym(kw):
+                self._ngrams.setdefault(' '.join(_WORD.findall(kw)) + 's', kw)
+        self._max_words = max((key.count(' ') + 1 for key in list(self._ngrams) + list(self._acronyms)), default=0)
+
+    @staticmethod
+    def _is_acronym(kw: str) -> bool:
+        return kw.isupper()
+
+    def find(self, text: str) -> Set[str]:
+        if not self.word_boundaries:
+            lowered = text.lower()
+            return {kw for kw in self.keyword_labels
+                    if (kw in text if self._is_acronym(kw) else kw in lowered)}
+
+        words = _WORD.findall(text.lower())
+        ngrams = self._ngrams
+        found = {ngrams[w] for w in words if w in ngrams}
+        for n in range(2, self._max_words + 1):
+            for i in range(len(words) - n + 1):
+                kw = ngrams.get(' '.join(words[i:i + n]))
+                if kw is not None:
+                    found.add(kw)
+        # Cheap test first: acronyms need at least one capital letter
+        if self._acronyms and not text.islower():
+            acronyms = self._acronyms
+            original = _WORD.findall(text)
+            for n in range(1, self._max_words + 1):
+                for i in range(len(original) - n + 1):
+                    kw = acronyms.get(' '.join(original[i:i + n]))
+                    if kw is not None:
+                        found.add(kw)
+        return found
+
+    def count(self, texts: Iterable[str]) -> Counter:
+        """Number of texts each keyword appears in."""
+        hits = Counter()
+        for text in texts:
+            hits.update(self.find(text))
+        return hits
+
+    def score(self, keywords: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """Per dimension, the number of distinct matched keywords for each label."""
+        scores = {dimension: {label: 0 for label in table} for dimension, table in self.tables.items()}
+        for kw in set(keywords):
+            for dimension, label in self.keyword_labels.get(kw, ()):
+                scores[dimension][label] += 1
+        return scores
@@ -0,0 +1,155 @@
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*\s*(.*?)(?:```|$)", re.DOTALL)
+_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_NUMBERING_RE = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*")
+
+_decoder = json.JSONDecoder()
+
+# How each model response was parsed:
+#   clean     - the whole response was valid JSON of the expected type
+#   extracted - valid JSON found inside code fences or surrounding prose
+#   salvaged  - JSON was broken (usually truncated); quoted strings recovered
+#   failed    - nothing usable
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(outcome: str) -> None:
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def parse_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return {k: _stats[k] for k in ("clean", "extracted", "salvaged", "failed")}
+
+
+def _strip_fences(text: str) -> str:
+    match = _FENCE_RE.search(text)
+    return match.group(1) if match else text
+
+
+def _decode_from(text: str, opener: str) -> Optional[Any]:
+    """Decode the first JSON value starting at an `opener` character, ignoring trailing prose."""
+    start = text.find(opener)
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            return value
+        except json.JSONDecodeError:
+            start = text.find(opener, start + 1)
+    return None
+
+
+def _salvage_strings(text: str) -> List[str]:
+    strings = []
+    for match in _STRING_RE.finditer(text):
+        try:
+            strings.append(json.loads(f'"{match.group(1)}"'))
+        except json.JSONDecodeError:
+            continue
+    return strings
+
+
+def normalize_queries(items: List[Any], limit: Optional[int] = None) -> List[str]:
+    """Turn model output items into clean, de-duplicated query strings."""
+    queries = []
+    seen = set()
+    for item in items:
+        if isinstance(item, dict):
+            item = item.get("query") or next((v for v in item.values() if isinstance(v, str)), None)
+        if item is None or isinstance(item, (list, dict)):
+            continue
+        query = " ".join(_NUMBERING_RE.sub("", str(item)).split()).strip("\"'")
+        if not query or query.lower() in seen:
+            continue
+        seen.add(query.lower())
+        queries.append(query)
+        if limit is not None and len(queries) >= limit:
+            break
+    return queries
+
+
+def extract_query_list(raw: str, limit: Optional[int] = None) -> List[str]:
+    """
+    Pull a list of queries out of a model response that should have been a
+    bare JSON array but may be fenced, wrapped in prose or cut off mid-array.
+    Raises ValueError when nothing usable is found.
+    """
+    text = raw.strip()
+
+    try:
+        value = json.loads(text)
+        if isinstance(value, list):
+            queries = normalize_queries(value, limit)
+            if queries:
+                _count("clean")
+                return queries
+    except json.JSONDecodeError:
+        pass
+
+    body = _strip_fences(text)
+    value = _decode_from(body, "[")
+    if isinstance(value, list):
+        queries = normalize_queries(value, limit)
+        if queries:
+            _count("extracted")
+            return queries
+
+    start = body.find("[")
+    queries = normalize_queries(_salvage_strings(body[start:] if start != -1 else body), limit)
+    if queries:
+        _count("salvaged")
+        return queries
+
+    _count("failed")
+    raise ValueError("No JSON array of queries found in model response.")
+
+
+def extract_query_map(raw: str, keys: List[str], limit: Optional[int] = None) -> Dict[str, List[str]]:
+    """
+    Pull {key: [queries]} out of a model response that should have been a JSON
+    object. Keys whose arrays cannot be recovered are left out.
+    Raises ValueError when no key could be recovered.
+    """
+    text = raw.strip()
+    outcome = "clean"
+
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        value = _decode_from(_strip_fences(text), "{")
+        outcome = "extracted"
+
+    result = {}
+    if isinstance(value, dict):
+        for key in keys:
+            if isinstance(value.get(key), list):
+                queries = normalize_queries(value[key], limit)
+                if queries:
+                    result[key] = queries
+    else:
+        # Truncated object: recover each key's array up to where it was cut off
+        outcome = "salvaged"
+        body = _strip_fences(text)
+        for key in keys:
+            match = re.search(rf'"{re.escape(key)}"\s*:\s*\[', body)
+            if not match:
+                continue
+            end = body.find("]", match.end())
+            segment = body[match.end():end if end != -1 else len(body)]
+            queries = normalize_queries(_salvage_strings(segment), limit)
+            if queries:
+                result[key] = queries
+
+    if not result:
+        _count("failed")
+        raise ValueError("No JSON object of queries found in model response.")
+
+    _count(outcome)
+    return result
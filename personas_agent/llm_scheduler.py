@@ -0,0 +1,315 @@
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Priority classes, highest first
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, BATCH, BACKGROUND)
+
+# (priority, client id) of the LLM calls made in the current context. Work
+# nobody is waiting on (reservoir refills, scripts) runs as background
+_current: contextvars.ContextVar = contextvars.ContextVar('llm_priority', default=(BACKGROUND, None))
+
+
+class LLMOverloaded(Exception):
+    """An LLM call was refused: 'rate_limited', 'queue_full' or 'timeout'."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f'LLM call refused ({reason}), retry after {retry_after:.0f}s')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@contextmanager
+def llm_priority(priority: str, client_id: Optional[str] = None) -> Iterator[None]:
+    """Run the LLM calls made inside the block with this priority, on behalf of `client_id`."""
+    token = _current.set((priority, client_id))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def run_as(priority: str, client_id: Optional[str], fn: Callable, /, *args, **kwargs):
+    """fn(*args, **kwargs) under llm_priority; for work handed to executor threads."""
+    with llm_priority(priority, client_id):
+        return fn(*args, **kwargs)
+
+
+def current_priority() -> Tuple[str, Optional[str]]:
+    return _current.get()
+
+
+class LLMScheduler:
+    """
+    Admission control for calls to the model server.
+
+    At most `max_concurrent` calls run at once. Further calls wait in one
+    FIFO queue per priority class, and a freed slot always goes to the
+    highest class with a waiter, so interactive requests overtake queued
+    batch and background work. Instead of queueing without bound, a call is
+    refused at once with LLMOverloaded when its class already has
+    `max_waiting[priority]` waiters, or after waiting `max_wait` seconds.
+    Clients (calls with a client id) also draw from a token bucket refilled
+    at `rate` calls per second up to `burst`. The suggested retry delay is
+    estimated from the queue ahead and the average call duration.
+
+    Work handed to a thread pool with submit() counts as waiting in its class
+    until it starts, so a backlog in the pool's queue is shed the same way
+    rather than hidden behind its few worker threads.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_waiting: Optional[Dict[str, int]] = None,
+        max_wait: float = 120,
+        rate: float = 0.5,
+        burst: float = 20,
+        max_clients: int = 1000):
+
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting or {INTERACTIVE: 32, BATCH: 16, BACKGROUND: 4}
+        self.max_wait = max_wait
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting: Dict[str, deque] = {p: deque() for p in PRIORITIES}
+        # Tasks from submit() still queued on their executor
+        self._queued = {p: 0 for p in PRIORITIES}
+        self._granted = set()
+        # ticket -> (event loop, asyncio.Event) for coroutines waiting in acquire_async
+        self._async_waiters = {}
+        # client_id -> [tokens, last refill]
+        self._buckets = OrderedDict()
+        # Exponentially weighted average call duration, for Retry-After
+        self._service_time = 5.0
+
+        self._admitted = {p: 0 for p in PRIORITIES}
+        self._rejected: Dict[Tuple[str, str], int] = {}
+        self._wait_seconds = {p: 0.0 for p in PRIORITIES}
+
+    def _backlog(self, priority: str) -> int:
+        return len(self._waiting[priority]) + self._queued[priority]
+
+    def _retry_after(self, priority: str) -> float:
+        ahead = self._running + sum(self._backlog(p) for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+        return max(1, math.ceil(ahead / self.max_concurrent * self._service_time))
+
+    def _reject(self, priority: str, reason: str, retry_after: float) -> None:
+        self._rejected[(priority, reason)] = self._rejected.get((priority, reason), 0) + 1
+        raise LLMOverloaded(reason, retry_after)
+
+    def _take_token(self, priority: str, client_id: str) -> None:
+        now = time.monotonic()
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = [self.burst, now]
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client_id)
+
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            self._reject(priority, 'rate_limited', math.ceil((1 - bucket[0]) / self.rate))
+        bucket[0] -= 1
+
+    def check(self, priority: str) -> None:
+        """Raise LLMOverloaded if a call of this class would be shed right now."""
+        with self._cond:
+            if self._backlog(priority) >= self.max_waiting[priority]:
+                self._reject(priority, 'queue_full', self._retry_after(priority))
+
+    def submit(
+        self,
+        executor: Executor,
+        priority: str,
+        client_id: Optional[str],
+        tasks: Sequence[Callable[[], Any]]) -> List[Future]:
+        """
+        Run each task on `executor` under llm_priority(priority, client_id).
+        Until a task starts it counts as a waiter of its class; if the tasks
+        do not all fit under max_waiting[priority], none is submitted and
+        LLMOverloaded('queue_full') is raised.
+        """
+        with self._cond:
+            if self._backlog(priority) + len(tasks) > self.max_waiting[priority]:
+                self._reject(priority, 'queue_full', self._retry_after(priority))
+            self._queued[priority] += len(tasks)
+
+        futures = []
+        for task in tasks:
+            future = executor.submit(self._run_queued, priority, client_id, task)
+            # A task cancelled before it started never reaches _run_queued
+            future.add_done_callback(lambda f: f.cancelled() and self._unqueue(priority))
+            futures.append(future)
+        return futures
+
+    def _unqueue(self, priority: str) -> None:
+        with self._cond:
+            self._queued[priority] -= 1
+
+    def _run_queued(self, priority: str, client_id: Optional[str], task: Callable[[], Any]):
+        self._unqueue(priority)
+        return run_as(priority, client_id, task)
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrent:
+            queue = next((self._waiting[p] for p in PRIORITIES if self._waiting[p]), None)
+            if queue is None:
+                break
+            ticket = queue.popleft()
+            self._granted.add(ticket)
+            self._running += 1
+            waiter = self._async_waiters.get(ticket)
+            if waiter is not None:
+                loop, event = waiter
+                loop.call_soon_threadsafe(event.set)
+        self._cond.notify_all()
+
+    def _enqueue(self, priority: str, client_id: Optional[str]) -> Optional[object]:
+        """Take a free slot (None) or join the queue (a ticket to wait on); caller holds the lock."""
+        if self._running < self.max_concurrent and not any(self._waiting.values()):
+            if client_id is not None:
+                self._take_token(priority, client_id)
+            self._running += 1
+            self._admitted[priority] += 1
+            return None
+
+        if self._backlog(priority) >= self.max_waiting[priority]:
+            self._reject(priority, 'queue_full', self._retry_after(priority))
+        if client_id is not None:
+            self._take_token(priority, client_id)
+        ticket = object()
+        self._waiting[priority].append(ticket)
+        return ticket
+
+    def _finish_wait(self, ticket: object, priority: str, started: float) -> None:
+        """Account for a granted ticket, or leave the queue and time out; caller holds the lock."""
+        if ticket not in self._granted:
+            self._waiting[priority].remove(ticket)
+            self._reject(priority, 'timeout', self._retry_after(priority))
+        self._granted.discard(ticket)
+        self._admitted[priority] += 1
+        self._wait_seconds[priority] += time.monotonic() - started
+
+    def acquire(self, priority: str, client_id: Optional[str] = None) -> None:
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(priority, client_id)
+            if ticket is None:
+                return
+            deadline = started + self.max_wait
+            while ticket not in self._granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._finish_wait(ticket, priority, started)
+
+    async def acquire_async(self, priority: str, client_id: Optional[str] = None) -> None:
+        """acquire() for coroutines: waits on an asyncio.Event instead of blocking a thread."""
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(priority, client_id)
+            if ticket is None:
+                return
+            event = asyncio.Event()
+            self._async_waiters[ticket] = (asyncio.get_running_loop(), event)
+        try:
+            await asyncio.wait_for(event.wait(), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Give back a slot granted just as the caller went away
+            with self._cond:
+                del self._async_waiters[ticket]
+                if ticket in self._granted:
+                    self._granted.discard(ticket)
+                    self._running -= 1
+                    self._dispatch()
+                else:
+                    self._waiting[priority].remove(ticket)
+            raise
+        with self._cond:
+            del self._async_waiters[ticket]
+            self._finish_wait(ticket, priority, started)
+
+    def release(self, duration: Optional[float] = None) -> None:
+        with self._cond:
+            self._running -= 1
+            if duration is not None:
+                self._service_time += 0.2 * (duration - self._service_time)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None, client_id: Optional[str] = None) -> Iterator[None]:
+        """Hold a slot for one call; priority and client default to the current llm_priority."""
+        if priority is None:
+            priority, client_id = current_priority()
+        self.acquire(priority, client_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def slot_async(self, priority: Optional[str] = None, client_id: Optional[str] = None) -> AsyncIterator[None]:
+        """slot() for coroutines, e.g. around AsyncOllamaClient calls."""
+        if priority is None:
+            priority, client_id = current_priority()
+        await self.acquire_async(priority, client_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'running': self._running,
+                'max_concurrent': self.max_concurrent,
+                'waiting': {p: len(q) for p, q in self._waiting.items()},
+                'queued': dict(self._queued),
+                'admitted': dict(self._admitted),
+                'rejected': [
+                    {'priority': p, 'reason': reason, 'count': count}
+                    for (p, reason), count in sorted(self._rejected.items())
+                ],
+                'average_wait_seconds': {
+                    p: self._wait_seconds[p] / self._admitted[p] if self._admitted[p] else 0.0
+                    for p in PRIORITIES
+                },
+                'average_call_seconds': self._service_time,
+                'clients': len(self._buckets)
+            }
+
+
+_scheduler = LLMScheduler()
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    with _scheduler_lock:
+        return _scheduler
+
+
+def set_llm_scheduler(scheduler: LLMScheduler) -> None:
+    """Replace the shared scheduler, e.g. with one configured by the server."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
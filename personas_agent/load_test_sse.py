@@ -0,0 +1,93 @@
+"""
+Load test for /api/stream: open many concurrent SSE connections, approve a
+few queries and check every connection receives every one of them.
+
+Start the async server first (raise the open-file limit for large runs):
+
+    ulimit -n 16384 && uvicorn asgi_app:app --port 5001
+    python load_test_sse.py --streams 5000 --queries 3
+"""
+
+import argparse
+import asyncio
+import resource
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+async def open_stream(client, url, client_id, expected, connected, received):
+    arrivals = []
+    async with client.stream("GET", f"{url}/api/stream", params={"client_id": client_id}) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("retry:"):
+                connected.release()
+            elif line.startswith("data:"):
+                arrivals.append(time.perf_counter())
+                if len(arrivals) == expected:
+                    break
+    received.append(arrivals)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--streams", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--client-id", default="load-test")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, args.streams + 256)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(None, connect=30)
+    connected = asyncio.Semaphore(0)
+    received = []
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(open_stream(client, args.url, args.client_id, args.queries, connected, received))
+            for _ in range(args.streams)
+        ]
+        for _ in range(args.streams):
+            await connected.acquire()
+        connect_seconds = time.perf_counter() - started
+        print(f"{args.streams} streams connected in {connect_seconds:.2f}s")
+
+        # Unique per run and unlike each other, so the server's duplicate
+        # filter (exact and near repeats of issued queries) keeps them all
+        queries = [f"load test {uuid.uuid4().hex}" for _ in range(args.queries)]
+        response = await client.post(
+            f"{args.url}/api/approve",
+            params={"client_id": args.client_id},
+            json={"queries": queries},
+        )
+        response.raise_for_status()
+        approved_at = time.perf_counter()
+        print(f"approved {args.queries} queries: {response.json()['message']}")
+        if response.json().get("duplicates_skipped"):
+            for task in tasks:
+                task.cancel()
+            raise SystemExit("the server dropped some queries as duplicates; streams would wait forever")
+
+        await asyncio.gather(*tasks)
+
+    complete = sum(1 for arrivals in received if len(arrivals) == args.queries)
+    print(f"{complete}/{args.streams} streams received all {args.queries} queries")
+
+    for i in range(args.queries):
+        times = sorted(arrivals[i] for arrivals in received)
+        spread = (times[-1] - times[0]) * 1000
+        p50 = statistics.median(times) - approved_at
+        print(f"  query {i}: released {times[0] - approved_at:.2f}s after approval, "
+              f"p50 arrival {p50:.2f}s, fan-out spread {spread:.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+import bisect
+import math
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+# Seconds; spans fast cache-served routes up to slow local LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Union[float, Iterable[Tuple[Dict[str, str], float]]]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Exact sample value: integers as is, floats by repr, infinities and NaN by name."""
+    if isinstance(value, int):
+        return str(int(value))
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Metrics:
+    """
+    Minimal Prometheus registry. Counters and histograms are updated in place
+    under one lock (a dict lookup and an add on the hot path); values other
+    components already track, like queue depth or cache hits, are registered
+    as callbacks and only read when /metrics is scraped.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        # name -> labels -> [count per bucket..., count above the last bucket, sum, count]
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = defaultdict(dict)
+        self._callbacks: List[Tuple[str, Callable[[], Sample]]] = []
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms[name]
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(self.buckets) + 3)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def register(self, name: str, kind: str, help_text: str, collect: Callable[[], Sample]) -> None:
+        """
+        Export a value read at scrape time. `collect` returns a number, or
+        (labels, value) pairs for a labelled family.
+        """
+        self.describe(name, kind, help_text)
+        self._callbacks.append((name, collect))
+
+    def _header(self, lines: List[str], name: str, default_kind: str) -> None:
+        kind, help_text = self._help.get(name, (default_kind, ''))
+        if help_text:
+            lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+
+        for name, series in sorted(counters.items()):
+            self._header(lines, name, 'counter')
+            for labels, value in sorted(series.items()):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for name, series in sorted(histograms.items()):
+            self._header(lines, name, 'histogram')
+            for labels, counts in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, (("le", _format_value(bound)),))} {_format_value(cumulative)}')
+                lines.append(f'{name}_bucket{_format_labels(labels, (("le", "+Inf"),))} {_format_value(counts[-1])}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(counts[-2])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {_format_value(counts[-1])}')
+
+        for name, collect in self._callbacks:
+            try:
+                sample = collect()
+            except Exception as e:
+                print(f"Error collecting metric {name}: {e}")
+                continue
+            self._header(lines, name, 'gauge')
+            if isinstance(sample, (int, float)):
+                lines.append(f'{name} {_format_value(sample)}')
+                continue
+            for labels, value in sample:
+                lines.append(f'{name}{_format_labels(_labels(labels))} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
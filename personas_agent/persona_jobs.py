@@ -0,0 +1,205 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from llm_scheduler import BATCH, LLMScheduler
+
+# (persona ids, client id) -> {persona id: queries}
+GenerateFn = Callable[[List[str], Optional[str]], Dict[str, List[str]]]
+# (index, persona id, queries) -> persona dict, like flask_app.build_persona
+BuildFn = Callable[[int, str, List[str]], Dict[str, Any]]
+# (client id, event name, payload)
+PublishFn = Callable[[Optional[str], str, Dict[str, Any]], None]
+
+
+class JobStoreFull(Exception):
+    pass
+
+
+class PersonaJob:
+
+    def __init__(self, persona_ids: List[str], client_id: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.persona_ids = persona_ids
+        self.client_id = client_id
+        self.status = 'running'
+        self.personas: List[Optional[Dict[str, Any]]] = [None] * len(persona_ids)
+        self.failed_personas: List[str] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.timer: Optional[threading.Timer] = None
+        self.futures: List[Future] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status != 'running'
+
+    def to_dict(self) -> Dict[str, Any]:
+        ready = [p for p in self.personas if p is not None]
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'persona_ids': self.persona_ids,
+            'personas': ready,
+            'completed': len(ready),
+            'total': len(self.persona_ids),
+            'failed_personas': list(self.failed_personas),
+            'created_at': datetime.fromtimestamp(self.created_at).isoformat(),
+            'finished_at': datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None
+        }
+
+
+class PersonaJobRunner:
+    """
+    Runs persona generation in the background so the submitting request
+    returns at once with a job id.
+
+    Each group of persona ids (one persona, or all of them in batched mode)
+    is one batch-priority task on `executor`, submitted through `scheduler`
+    so a job whose tasks would overfill the batch queue is refused with
+    LLMOverloaded. As a persona's queries arrive it is stored on
+    the job and published as a 'persona' event to the submitting client; a
+    'job' event follows when every persona is done or `timeout` passes, in
+    which case unfinished personas are reported as failed and their tasks
+    are cancelled if they have not started yet. Finished jobs stay
+    queryable until `ttl` expires or more than `max_jobs` are stored, oldest
+    first; running jobs are never evicted, so submissions are refused while
+    `max_jobs` are still running.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        scheduler: LLMScheduler,
+        generate: GenerateFn,
+        build: BuildFn,
+        publish: PublishFn,
+        timeout: float = 150,
+        max_jobs: int = 500,
+        ttl: float = 60 * 60):
+
+        self.executor = executor
+        self.scheduler = scheduler
+        self.generate = generate
+        self.build = build
+        self.publish = publish
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs: Dict[str, PersonaJob] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self) -> None:
+        now = time.time()
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.finished and (len(self._jobs) >= self.max_jobs or now - job.finished_at > self.ttl):
+                del self._jobs[job_id]
+
+    def submit(self, persona_ids: List[str], client_id: Optional[str], batched: bool = False) -> PersonaJob:
+        job = PersonaJob(persona_ids, client_id)
+        with self._lock:
+            self._evict()
+            if len(self._jobs) >= self.max_jobs:
+                raise JobStoreFull(f'{len(self._jobs)} persona jobs are still running')
+            self._jobs[job.id] = job
+
+        job.timer = threading.Timer(self.timeout, self._finish, args=(job, True))
+        job.timer.daemon = True
+        job.timer.start()
+
+        groups = [persona_ids] if batched else [[pid] for pid in persona_ids]
+        try:
+            job.futures = self.scheduler.submit(
+                self.executor, BATCH, client_id, [partial(self.generate, group, client_id) for group in groups]
+            )
+        except BaseException:
+            job.timer.cancel()
+            with self._lock:
+                del self._jobs[job.id]
+            raise
+        for group, future in zip(groups, job.futures):
+            future.add_done_callback(lambda f, group=group: self._on_done(job, group, f))
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's current state, or None if it is unknown or was evicted."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def _on_done(self, job: PersonaJob, group: List[str], future) -> None:
+        if future.cancelled():
+            # Cancelled by _finish when the job timed out
+            return
+        try:
+            results = future.result()
+            error = None
+        except Exception as e:
+            results, error = {}, e
+
+        for persona_id in group:
+            queries = results.get(persona_id)
+            if error is not None or queries is None:
+                if self._store(job, persona_id, [], failed=True):
+                    print(f"Error generating queries for {persona_id} (job {job.id}): {error or 'missing from results'}")
+            elif self._store(job, persona_id, queries, failed=False):
+                print(f"Generated {len(queries)} queries for {persona_id} (job {job.id})")
+
+    def _store(self, job: PersonaJob, persona_id: str, queries: List[str], failed: bool) -> bool:
+        """Record a persona's result; False if the job already finished (timed out)."""
+        index = job.persona_ids.index(persona_id)
+        with self._lock:
+            if job.finished:
+                return False
+            persona = self.build(index, persona_id, queries)
+            job.personas[index] = persona
+            if failed:
+                job.failed_personas.append(persona_id)
+            complete = all(p is not None for p in job.personas)
+
+        self.publish(job.client_id, 'persona', {
+            'job_id': job.id,
+            'index': index,
+            'persona': persona,
+            'failed': failed
+        })
+        if complete:
+            self._finish(job, False)
+        return True
+
+    def _finish(self, job: PersonaJob, timed_out: bool) -> None:
+        with self._lock:
+            if job.finished:
+                return
+            if timed_out:
+                for index, persona_id in enumerate(job.persona_ids):
+                    if job.personas[index] is None:
+                        print(f"Timed out generating queries for {persona_id} (job {job.id})")
+                        job.personas[index] = self.build(index, persona_id, [])
+                        job.failed_personas.append(persona_id)
+            job.status = 'failed' if len(job.failed_personas) == len(job.persona_ids) else 'done'
+            job.finished_at = time.time()
+        if timed_out:
+            # Groups still queued on the executor would only produce results
+            # nobody stores; running ones finish and are then ignored
+            for future in list(job.futures):
+                future.cancel()
+        else:
+            job.timer.cancel()
+
+        self.publish(job.client_id, 'job', {
+            'job_id': job.id,
+            'status': job.status,
+            'failed_personas': list(job.failed_personas)
+        })
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if not job.finished)
+            return {'jobs': len(self._jobs), 'running': running}
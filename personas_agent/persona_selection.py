@@ -0,0 +1,173 @@
+import itertools
+import random
+import threading
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from keyword_matcher import KeywordMatcher
+
+Profile = Dict[str, Any]
+
+
+class PersonaSelector:
+    """
+    Picks the personas whose queries would dilute a profile the most.
+
+    Each persona's known queries (reservoir and cache, or its description
+    when none are generated yet) are scored once with the keyword matcher
+    into the expected label scores of executing `queries_per_persona` of
+    them. For a candidate set, those scores are added to the profile's own
+    to simulate the updated profile, which is rated with the comparator's
+    obfuscation score plus how far the dominant demographic labels and the
+    top interest lose their share. Every combination of `count` candidates is
+    tried and the best rating per executed query wins; ties are broken at
+    random so users with similar profiles do not all get the same personas.
+
+    The simulation works from the profile's label scores rather than the
+    raw searches, so keywords a persona shares with the user are counted as
+    new; it ranks candidates, it does not predict exact confidences.
+    """
+
+    def __init__(
+        self,
+        matcher: KeywordMatcher,
+        demographic_dimensions: Dict[str, Tuple[str, str, float]],
+        known_queries: Callable[[str], List[str]],
+        obfuscation_score: Callable[[Profile, Profile], float],
+        queries_per_persona: int = 10,
+        interest_dimension: str = 'interests',
+        top_interests: int = 5,
+        max_combinations: int = 5000):
+
+        self.matcher = matcher
+        self.demographic_dimensions = demographic_dimensions
+        self.known_queries = known_queries
+        self.obfuscation_score = obfuscation_score
+        self.queries_per_persona = queries_per_persona
+        self.interest_dimension = interest_dimension
+        self.top_interests = top_interests
+        self.max_combinations = max_combinations
+
+        # persona id -> (pool signature, expected label scores)
+        self._persona_scores: Dict[str, Tuple[int, Dict[str, Dict[str, float]]]] = {}
+        self._lock = threading.Lock()
+
+    def persona_scores(self, persona_id: str) -> Dict[str, Dict[str, float]]:
+        """Expected label scores from executing `queries_per_persona` of the persona's queries."""
+        pool = self.known_queries(persona_id)
+        signature = hash(tuple(pool))
+        with self._lock:
+            cached = self._persona_scores.get(persona_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        scores = {dimension: {label: 0.0 for label in table} for dimension, table in self.matcher.tables.items()}
+        if pool:
+            # A keyword found in f of n pool queries shows up in a random
+            # sample of q of them with probability 1 - (1 - f/n)^q
+            n = len(pool)
+            q = min(self.queries_per_persona, n)
+            for kw, f in self.matcher.count(pool).items():
+                p = 1 - (1 - f / n) ** q
+                for dimension, label in self.matcher.keyword_labels[kw]:
+                    scores[dimension][label] += p
+
+        with self._lock:
+            self._persona_scores[persona_id] = (signature, scores)
+        return scores
+
+    def _base_scores(self, profile: Profile) -> Dict[str, Dict[str, float]]:
+        scores = {dimension: {label: 0.0 for label in table} for dimension, table in self.matcher.tables.items()}
+        demographics = profile.get('demographics', {})
+        for key, (dimension, _, _) in self.demographic_dimensions.items():
+            for label, score in demographics.get(key, {}).get('scores', {}).items():
+                if label in scores[dimension]:
+                    scores[dimension][label] += score
+        for category, info in profile.get('interests', {}).get('categories', {}).items():
+            if category in scores[self.interest_dimension]:
+                scores[self.interest_dimension][category] += info.get('count', 0)
+        return scores
+
+    def simulate(self, profile: Profile, persona_ids: Sequence[str]) -> Profile:
+        """The profile as it would look after executing every persona's queries."""
+        scores = self._base_scores(profile)
+        for persona_id in persona_ids:
+            for dimension, labels in self.persona_scores(persona_id).items():
+                for label, score in labels.items():
+                    scores[dimension][label] += score
+
+        demographics = {}
+        for key, (dimension, value_key, full_confidence_at) in self.demographic_dimensions.items():
+            label_scores = scores[dimension]
+            top = max(label_scores.values(), default=0)
+            if top <= 0:
+                demographics[key] = {value_key: 'unknown', 'confidence': 0.0}
+                continue
+            demographics[key] = {
+                value_key: max(label_scores, key=label_scores.get),
+                'confidence': min(top / full_confidence_at, 1.0),
+                'scores': label_scores
+            }
+
+        total = profile.get('metadata', {}).get('total_searches', 0) + self.queries_per_persona * len(persona_ids)
+        categories = {
+            category: {'count': count, 'percentage': count / total * 100 if total else 0.0}
+            for category, count in sorted(scores[self.interest_dimension].items(), key=lambda x: x[1], reverse=True)
+            if count > 0
+        }
+
+        return {
+            'demographics': demographics,
+            'interests': {'categories': categories, 'top_interests': list(categories)[:self.top_interests]},
+            'metadata': {'total_searches': total}
+        }
+
+    @staticmethod
+    def _share_lost(before: float, after: float) -> float:
+        return (before - after) / before if before > 0 else 0.0
+
+    def rate(self, profile: Profile, persona_ids: Sequence[str]) -> float:
+        """Predicted obfuscation per executed query of adding `persona_ids`."""
+        if not persona_ids:
+            return 0.0
+        simulated = self.simulate(profile, persona_ids)
+        initial_scores = self._base_scores(profile)
+
+        dilution = []
+        for key, (dimension, _, _) in self.demographic_dimensions.items():
+            before, after = initial_scores[dimension], simulated['demographics'][key].get('scores')
+            if not after or sum(before.values()) <= 0:
+                continue
+            dominant = max(before, key=before.get)
+            dilution.append(self._share_lost(
+                before[dominant] / sum(before.values()),
+                after[dominant] / sum(after.values())
+            ))
+
+        top_interests = profile.get('interests', {}).get('top_interests', [])
+        if top_interests:
+            top = top_interests[0]
+            before = profile['interests']['categories'].get(top, {}).get('percentage', 0)
+            after = simulated['interests']['categories'].get(top, {}).get('percentage', 0)
+            dilution.append(self._share_lost(before, after))
+
+        rating = self.obfuscation_score(profile, simulated)
+        if dilution:
+            rating += 100 * sum(dilution) / len(dilution)
+        return rating / (self.queries_per_persona * len(persona_ids))
+
+    def select(self, profile: Profile, candidates: Sequence[str], count: int) -> List[str]:
+        candidates = list(candidates)
+        count = min(count, len(candidates))
+        if count <= 0:
+            return []
+        random.shuffle(candidates)
+
+        combinations = itertools.combinations(candidates, count)
+        best, best_rating = None, float('-inf')
+        for i, combination in enumerate(combinations):
+            if i >= self.max_combinations:
+                break
+            rating = self.rate(profile, combination)
+            if rating > best_rating:
+                best, best_rating = list(combination), rating
+        return best
@@ -1,10 +1,21 @@
 import os
 import sys
-import json
+from typing import Optional
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from utils import query_ollama
+from llm_scheduler import get_llm_scheduler
+from llm_parsing import extract_query_list, extract_query_map
+from query_cache import QueryCache
+from query_index import QueryIndex
+from query_reservoir import QueryReservoir
+
+# Bump whenever the generation prompt changes so cached pools are not reused
+PROMPT_VERSION = 1
+QUERIES_PER_PERSONA = 10
+# Personas per LLM call in batched mode
+BATCH_SIZE = 5
 
 PERSONAS = [
     { "id": "outdoor_enthusiast", "label": "Outdoor Enthusiast", "description": "hiking, camping, backpacking, trail running, climbing, national parks, gear reviews" },
@@ -22,19 +33,170 @@ PERSONAS = [
 
 class PersonaSearchRecommender:
 
-    def __init__(self, model: str = "llama3.2"):
+    def __init__(self, model: str = "llama3.2", cache: Optional[QueryCache] = None, index: Optional[QueryIndex] = None):
         self.model = model
+        self.cache = cache
+        # Issued queries: generated and pooled queries that repeat one are dropped
+        self.index = index
+        self.reservoir = None
         self._persona_map = {p["id"]: p for p in PERSONAS}
 
-    def get_search_query_recommendations(self, persona_id: str) -> list[str]:
+    def start_pregeneration(self, low_watermark: int = 10, high_watermark: int = 30, workers: int = 1) -> QueryReservoir:
+        """Keep a reservoir of fresh queries per persona filled in the background."""
+        if self.reservoir is None:
+            self.reservoir = QueryReservoir(
+                lambda persona_id: self._novel(self._generate_queries(self._persona_map[persona_id])),
+                self._persona_map.keys(),
+                low_watermark=low_watermark,
+                high_watermark=high_watermark,
+                workers=workers,
+            )
+            self.reservoir.start()
+        return self.reservoir
+
+    def _get_persona(self, persona_id: str) -> dict:
         persona = self._persona_map.get(persona_id)
         if persona is None:
             raise ValueError(
                 f"Unknown persona id '{persona_id}'. "
                 f"Valid ids: {list(self._persona_map.keys())}"
             )
+        return persona
+
+    def get_search_query_recommendations(self, persona_id: str, client_id: Optional[str] = None) -> list[str]:
+        persona = self._get_persona(persona_id)
+        queries = self._ready_queries(persona, client_id)
+        return self._complete(persona, queries, client_id)
+
+    def get_batch_recommendations(self, persona_ids: list[str], client_id: Optional[str] = None) -> dict[str, list[str]]:
+        """
+        Like get_search_query_recommendations for several personas at once, but
+        personas that need fresh queries share one structured-JSON LLM call per
+        BATCH_SIZE personas. Personas missing from or malformed in the batched
+        output fall back to their own per-persona call.
+        """
+        personas = [self._get_persona(pid) for pid in persona_ids]
+        ready = {p["id"]: self._ready_queries(p, client_id) for p in personas}
+
+        short = [p for p in personas if len(ready[p["id"]]) < QUERIES_PER_PERSONA]
+        generated = {}
+        for i in range(0, len(short), BATCH_SIZE):
+            try:
+                generated.update(self._generate_batch(short[i:i + BATCH_SIZE]))
+            except RuntimeError as e:
+                print(f"Batched generation failed, falling back to per-persona calls: {e}")
+
+        return {
+            p["id"]: self._complete(p, ready[p["id"]], client_id, generated.get(p["id"]))
+            for p in personas
+        }
+
+    def _ready_queries(self, persona: dict, client_id: Optional[str]) -> list[str]:
+        """Queries available without calling the LLM: the reservoir first, then the cache."""
+        queries = []
+        if self.reservoir is not None:
+            queries = self.reservoir.take(persona["id"], QUERIES_PER_PERSONA)
+        if self.cache is not None and len(queries) < QUERIES_PER_PERSONA:
+            key = (persona["id"], self.model, PROMPT_VERSION)
+            queries += self.cache.take(key, QUERIES_PER_PERSONA - len(queries), client_id)
+        # Pooled queries may have been issued since they were generated
+        return self._novel(queries, client_id)
 
+    def _novel(self, queries: list[str], client_id: Optional[str] = None) -> list[str]:
+        """
+        Queries `client_id` has not issued (nor near-repeats of each other).
+        Pools shared by all clients are only deduplicated, with no client id.
+        """
+        return self.index.novel(queries, client_id) if self.index is not None else queries
+
+    def known_queries(self, persona_id: str) -> list[str]:
+        """Queries already generated for a persona (reservoir and cache), without serving any."""
+        persona = self._get_persona(persona_id)
+        queries = []
+        if self.reservoir is not None:
+            queries += self.reservoir.peek(persona["id"])
+        if self.cache is not None:
+            queries += self.cache.peek((persona["id"], self.model, PROMPT_VERSION))
+        return list(dict.fromkeys(queries))
+
+    def _complete(
+        self,
+        persona: dict,
+        queries: list[str],
+        client_id: Optional[str],
+        generated: Optional[list[str]] = None) -> list[str]:
+        """Top `queries` up to QUERIES_PER_PERSONA with `generated`, or a fresh LLM call."""
+        if len(queries) < QUERIES_PER_PERSONA:
+            fresh = generated or self._generate_queries(persona)
+            if self.cache is None:
+                extra = fresh
+            else:
+                key = (persona["id"], self.model, PROMPT_VERSION)
+                self.cache.add(key, self._novel(fresh))
+                extra = self.cache.take(key, QUERIES_PER_PERSONA - len(queries), client_id)
+            if self.index is not None:
+                # `queries` already passed the index, so they all survive and
+                # only extra ones repeating them or an issued query are dropped
+                extra = self.index.novel(queries + extra, client_id)[len(queries):]
+            queries = queries + extra
+
+        return list(dict.fromkeys(queries))[:QUERIES_PER_PERSONA]
+
+    def _generate_batch(self, personas: list[dict]) -> dict[str, list[str]]:
+        persona_lines = "\n".join(
+            f'- id "{p["id"]}": {p["label"]} (interests: {p["description"]})' for p in personas
+        )
         prompt = f"""
+You are generating realistic Google search queries for several types of readers.
+
+Personas:
+{persona_lines}
+
+For EACH persona, generate exactly 10 Google search queries that person would realistically type into Google.
+Keep each query natural and concise — the way a real person would search, not a full sentence.
+
+Respond with ONLY a valid JSON object that maps every persona id above to an array of 10 strings.
+No explanation, no markdown, no extra text.
+
+Example format:
+{{"persona_id_one": ["query one", "query two", ...], "persona_id_two": ["query one", ...]}}
+"""
+
+        raw_response = query_ollama(prompt, model=self.model, format="json")
+
+        # Personas missing from the parsed output are regenerated per persona
+        try:
+            return extract_query_map(raw_response, [p["id"] for p in personas], limit=QUERIES_PER_PERSONA)
+        except ValueError as e:
+            raise RuntimeError(
+                f"Failed to parse batched search queries from model response.\n"
+                f"Error: {e}\n"
+                f"Raw response: {raw_response}"
+            )
+
+    async def get_search_query_recommendations_async(
+        self,
+        persona_id: str,
+        client,
+        client_id: Optional[str] = None) -> list[str]:
+        """
+        get_search_query_recommendations for the async server: the reservoir
+        and cache are consulted as usual, but the LLM call is awaited on
+        `client` (an AsyncOllamaClient) instead of blocking a thread. It takes
+        a scheduler slot at the caller's llm_priority like query_ollama does.
+        """
+        persona = self._get_persona(persona_id)
+        queries = self._ready_queries(persona, client_id)
+        generated = None
+        if len(queries) < QUERIES_PER_PERSONA:
+            async with get_llm_scheduler().slot_async():
+                raw_response = await client.generate(self._persona_prompt(persona), model=self.model)
+            generated = self._parse_queries(raw_response)
+        return self._complete(persona, queries, client_id, generated)
+
+    @staticmethod
+    def _persona_prompt(persona: dict) -> str:
+        return f"""
 You are generating realistic Google search queries for a specific type of reader.
 
 Persona: {persona["label"]}
@@ -49,19 +211,18 @@ Example format:
 ["query one", "query two", "query three", ...]
 """
 
-        raw_response = query_ollama(prompt, model=self.model)
-
+    @staticmethod
+    def _parse_queries(raw_response: str) -> list[str]:
         try:
-            queries = json.loads(raw_response.strip())
-            if not isinstance(queries, list):
-                raise ValueError("Response was not a JSON array.")
-            # Ensure we always return exactly 10 strings
-            queries = [str(q) for q in queries[:10]]
-        except (json.JSONDecodeError, ValueError) as e:
+            # Tolerates code fences, surrounding prose and truncated arrays
+            return extract_query_list(raw_response, limit=QUERIES_PER_PERSONA)
+        except ValueError as e:
             raise RuntimeError(
                 f"Failed to parse search queries from model response.\n"
                 f"Error: {e}\n"
                 f"Raw response: {raw_response}"
             )
 
-        return queries
\ No newline at end of file
+    def _generate_queries(self, persona: dict) -> list[str]:
+        raw_response = query_ollama(self._persona_prompt(persona), model=self.model)
+        return self._parse_queries(raw_response)
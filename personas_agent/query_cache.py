@@ -0,0 +1,164 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+
+class QueryCache:
+    """
+    Pools of generated search queries keyed by (persona id, model, prompt version).
+
+    Pools live in an in-memory LRU with a TTL and can optionally be persisted to
+    SQLite so they survive restarts. Every query handed to a client is
+    remembered, so a client is never served the same query twice from a pool.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 64,
+        ttl: float = 6 * 60 * 60,
+        max_queries_per_entry: int = 200,
+        max_clients: int = 1000,
+        db_path: Optional[str] = None):
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_queries_per_entry = max_queries_per_entry
+        self.max_clients = max_clients
+
+        # key -> {'queries': [...], 'created_at': float}
+        self._entries = OrderedDict()
+        # client_id -> set of queries already served to that client
+        self._served = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_pools ("
+                "key TEXT PRIMARY KEY, queries TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._load()
+
+    @staticmethod
+    def _db_key(key: Hashable) -> str:
+        return json.dumps(key)
+
+    def _load(self) -> None:
+        now = time.time()
+        rows = self._db.execute(
+            "SELECT key, queries, created_at FROM query_pools ORDER BY created_at"
+        ).fetchall()
+        for db_key, queries, created_at in rows:
+            if now - created_at >= self.ttl:
+                continue
+            self._entries[tuple(json.loads(db_key))] = {
+                'queries': json.loads(queries),
+                'created_at': created_at
+            }
+        self._evict()
+
+    def _persist(self, key: Hashable, entry: Optional[dict]) -> None:
+        if self._db is None:
+            return
+        if entry is None:
+            self._db.execute("DELETE FROM query_pools WHERE key = ?", (self._db_key(key),))
+        else:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_pools (key, queries, created_at) VALUES (?, ?, ?)",
+                (self._db_key(key), json.dumps(entry['queries']), entry['created_at'])
+            )
+        self._db.commit()
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            self._persist(key, None)
+
+    def _entry(self, key: Hashable) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['created_at'] >= self.ttl:
+            del self._entries[key]
+            self._persist(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def add(self, key: Hashable, queries: List[str]) -> None:
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None:
+                entry = {'queries': [], 'created_at': time.time()}
+                self._entries[key] = entry
+
+            known = set(entry['queries'])
+            for q in queries:
+                if q not in known:
+                    entry['queries'].append(q)
+                    known.add(q)
+            # Keep the newest queries when the pool outgrows its bound
+            del entry['queries'][:-self.max_queries_per_entry]
+
+            self._persist(key, entry)
+            self._evict()
+
+    def take(self, key: Hashable, count: int, client_id: Optional[str] = None) -> List[str]:
+        """
+        Return up to `count` cached queries for `key` that `client_id` has not
+        been served yet, and remember them as served. Without a client id any
+        cached queries may be returned.
+        """
+        with self._lock:
+            picked = self._take(key, count, client_id)
+            if len(picked) >= count:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return picked
+
+    def peek(self, key: Hashable) -> List[str]:
+        """Every cached query for `key`, without serving or counting them."""
+        with self._lock:
+            entry = self._entry(key)
+            return list(entry['queries']) if entry is not None else []
+
+    def _take(self, key: Hashable, count: int, client_id: Optional[str]) -> List[str]:
+        entry = self._entry(key)
+        if entry is None:
+            return []
+
+        if client_id is None:
+            pool = entry['queries']
+            return random.sample(pool, min(count, len(pool)))
+
+        served = self._served.get(client_id)
+        if served is None:
+            served = self._served[client_id] = set()
+            while len(self._served) > self.max_clients:
+                self._served.popitem(last=False)
+        self._served.move_to_end(client_id)
+
+        unseen = [q for q in entry['queries'] if q not in served]
+        picked = random.sample(unseen, min(count, len(unseen)))
+        served.update(picked)
+        return picked
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'cached_queries': sum(len(e['queries']) for e in self._entries.values()),
+                'clients': len(self._served),
+                'hits': self.hits,
+                'misses': self.misses,
+                'persistent': self._db is not None
+            }
@@ -0,0 +1,233 @@
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 64 MinHash values in 16 bands of 4: queries sharing a band are compared, which
+# finds pairs above roughly (1/16) ** (1/4) = 0.5 Jaccard similarity
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Trigram hashes are already uniform 64-bit values, so XOR with a random mask
+# stands in for a permutation. It only has to find candidates, which are then
+# compared exactly. Fixed seed so buckets rebuilt from disk stay the same
+_rng = random.Random(0x5EED)
+_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERM)]
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize(query: str) -> str:
+    """Lowercase, punctuation stripped, whitespace collapsed."""
+    return ' '.join(_NON_WORD.sub(' ', query.lower()).split())
+
+
+def shingles(normalized: str) -> Set[str]:
+    """
+    Character trigrams of each word, padded so word starts and ends count.
+    Built per word, so reordered words ("boots hiking best") still match.
+    """
+    grams = set()
+    for word in normalized.split():
+        padded = f' {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _fingerprint(normalized: str, client_id: Optional[str] = None) -> int:
+    key = normalized if client_id is None else f'{client_id}\n{normalized}'
+    # Signed so it fits an SQLite INTEGER
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+
+def gram_hashes(normalized: str) -> array:
+    """Sorted 64-bit hashes of the query's trigrams."""
+    return array('Q', sorted(_hash64(g) for g in shingles(normalized)))
+
+
+def _bands(hashes: array, client_id: Optional[str] = None) -> List[Tuple[int, int]]:
+    values = hashes or (0,)
+    signature = [min(h ^ mask for h in values) for mask in _MASKS]
+    rows = [tuple(signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+    if client_id is not None:
+        # Each client's queries land in buckets of their own
+        salt = _hash64(client_id)
+        rows = [(salt,) + r for r in rows]
+    # hash() of a tuple of ints does not depend on PYTHONHASHSEED
+    return [(band, hash(r)) for band, r in enumerate(rows)]
+
+
+def similarity(a: array, b: array) -> float:
+    """Jaccard similarity of two queries' trigram hashes."""
+    if not a and not b:
+        return 1.0
+    common = len(set(a).intersection(b))
+    return common / (len(a) + len(b) - common)
+
+
+class QueryIndex:
+    """
+    Queries already issued (approved for execution), for spotting repeats.
+
+    Queries are recorded per client id: one client's issued queries never
+    make another's look like repeats. Within a client, a query is a
+    duplicate when its normalized text was issued before (one hash lookup)
+    or when it shares a MinHash/LSH band with an issued query whose trigram
+    Jaccard similarity is at least `threshold`. The client id is mixed into
+    the fingerprint and bucket keys, so clients share one table and one
+    `max_entries` budget. Queries with no client id form a namespace of
+    their own.
+
+    Lookups touch one dict and BANDS buckets, so they stay O(1) amortized
+    however many queries are stored. Only trigram hashes are kept, not query
+    text; the oldest entries are dropped beyond `max_entries`, and the index
+    can optionally be persisted to SQLite so it survives restarts.
+    """
+
+    def __init__(self, threshold: float = 0.7, max_entries: int = 10000, db_path: Optional[str] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        # fingerprint -> (trigram hashes, LSH bucket keys)
+        self._entries: Dict[int, Tuple[array, List[Tuple[int, int]]]] = OrderedDict()
+        # (band, band hash) -> fingerprints of entries in that bucket
+        self._buckets: Dict[Tuple[int, int], Set[int]] = {}
+        self._lock = threading.Lock()
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS issued_queries ("
+                "fingerprint INTEGER PRIMARY KEY, grams BLOB NOT NULL, bands BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._load()
+
+    def _load(self) -> None:
+        rows = self._db.execute("SELECT fingerprint, grams, bands FROM issued_queries ORDER BY created_at").fetchall()
+        for fingerprint, grams, bands in rows:
+            hashes, band_hashes = array('Q'), array('q')
+            hashes.frombytes(grams)
+            band_hashes.frombytes(bands)
+            self._insert(fingerprint, hashes, list(enumerate(band_hashes)))
+        evicted = self._evict()
+        if evicted:
+            self._db.executemany("DELETE FROM issued_queries WHERE fingerprint = ?", [(f,) for f in evicted])
+            self._db.commit()
+
+    def _insert(self, fingerprint: int, hashes: array, bands: List[Tuple[int, int]]) -> None:
+        self._entries[fingerprint] = (hashes, bands)
+        for key in bands:
+            self._buckets.setdefault(key, set()).add(fingerprint)
+
+    def _evict(self) -> List[int]:
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            fingerprint, (_, bands) = self._entries.popitem(last=False)
+            for key in bands:
+                bucket = self._buckets[key]
+                bucket.discard(fingerprint)
+                if not bucket:
+                    del self._buckets[key]
+            evicted.append(fingerprint)
+        return evicted
+
+    def _match(self, fingerprint: int, hashes: array, bands: List[Tuple[int, int]]) -> Optional[str]:
+        """'exact', 'near' or None for a query against the stored entries."""
+        if fingerprint in self._entries:
+            return 'exact'
+        candidates = set()
+        for key in bands:
+            candidates.update(self._buckets.get(key, ()))
+        for candidate in candidates:
+            if similarity(hashes, self._entries[candidate][0]) >= self.threshold:
+                return 'near'
+        return None
+
+    def _check(self, queries: Iterable[str], client_id: Optional[str], record: bool) -> List[str]:
+        novel = []
+        # Fresh queries are also checked against each other, so one batch
+        # cannot carry two variants of the same search
+        batch = QueryIndex(self.threshold, max_entries=float('inf'))
+        added = []
+        # Hashing is the expensive part; do it outside the lock
+        keyed = []
+        for query in queries:
+            normalized = normalize(query)
+            if normalized:
+                hashes = gram_hashes(normalized)
+                keyed.append((query, _fingerprint(normalized, client_id), hashes, _bands(hashes, client_id)))
+
+        with self._lock:
+            for query, fingerprint, hashes, bands in keyed:
+                match = self._match(fingerprint, hashes, bands) or batch._match(fingerprint, hashes, bands)
+                if match:
+                    # Only drops of recorded queries count; novel() is a lookup
+                    if record and match == 'exact':
+                        self.exact_duplicates += 1
+                    elif record:
+                        self.near_duplicates += 1
+                else:
+                    novel.append(query)
+                    batch._insert(fingerprint, hashes, bands)
+                    if record:
+                        self._insert(fingerprint, hashes, bands)
+                        added.append((fingerprint, hashes, bands))
+
+            if added:
+                evicted = self._evict()
+                self._persist(added, evicted)
+        return novel
+
+    def _persist(self, added: List[Tuple[int, array, List[Tuple[int, int]]]], evicted: List[int]) -> None:
+        if self._db is None:
+            return
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO issued_queries (fingerprint, grams, bands, created_at) VALUES (?, ?, ?, ?)",
+            [(f, hashes.tobytes(), array('q', [value for _, value in bands]).tobytes(), now)
+             for f, hashes, bands in added]
+        )
+        self._db.executemany("DELETE FROM issued_queries WHERE fingerprint = ?", [(f,) for f in evicted])
+        self._db.commit()
+
+    def novel(self, queries: Iterable[str], client_id: Optional[str] = None) -> List[str]:
+        """The queries that repeat neither one `client_id` issued nor an earlier one in `queries`."""
+        return self._check(queries, client_id, record=False)
+
+    def add(self, queries: Iterable[str], client_id: Optional[str] = None) -> List[str]:
+        """Record the novel queries as issued by `client_id` and return them; duplicates are dropped."""
+        return self._check(queries, client_id, record=True)
+
+    def __contains__(self, query: str) -> bool:
+        normalized = normalize(query)
+        hashes = gram_hashes(normalized)
+        bands = _bands(hashes)
+        with self._lock:
+            return self._match(_fingerprint(normalized), hashes, bands) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'issued_queries': len(self._entries),
+                'exact_duplicates': self.exact_duplicates,
+                'near_duplicates': self.near_duplicates,
+                'threshold': self.threshold,
+                'persistent': self._db is not None
+            }
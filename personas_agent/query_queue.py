@@ -0,0 +1,219 @@
+import heapq
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+# (item_id, release_at, client_id, query)
+QueueItem = Tuple[int, float, Optional[str], str]
+# (delivery_id, client_id, query)
+Delivery = Tuple[int, Optional[str], str]
+
+
+class QueueBackend:
+    """
+    Storage for approved queries waiting to be released, ordered by release
+    time. QueryScheduler only talks to this interface, so the queue can live in
+    process memory, in SQLite, or in something like Redis (a sorted set scored
+    by release time: ZADD to push, ZRANGE 0 0 to peek, ZREM to claim, ZADD XX
+    to defer).
+    """
+
+    # Seconds between checks for items pushed by other processes; None when
+    # every push happens in this process and wakes the scheduler directly.
+    poll_interval: Optional[float] = None
+
+    # Whether claimed items go to a delivery log every process reads (see
+    # deliveries). A backend shared between processes needs one: the process
+    # that claims an item is not necessarily the one holding the client's
+    # stream, and a broadcast has to reach the streams of every process.
+    shared_delivery = False
+
+    def push(self, client_id: Optional[str], queries: List[str], next_release: Callable[[float], float]) -> int:
+        """
+        Append queries for `client_id`, each released at next_release(release
+        time of that client's previous pending item, or 0), atomically with
+        respect to other pushers. Clients are paced independently, so one
+        client's backlog never delays another's queries. Returns the number of
+        pending items.
+        """
+        raise NotImplementedError
+
+    def peek(self) -> Optional[QueueItem]:
+        """The item with the earliest release time, without removing it."""
+        raise NotImplementedError
+
+    def claim(self, item_id: int) -> bool:
+        """Remove an item; True only for the one caller that actually removed it."""
+        raise NotImplementedError
+
+    def defer(self, item_id: int, release_at: float) -> None:
+        """Move a pending item to a later release time (no-op if it was claimed)."""
+        raise NotImplementedError
+
+    def latest_delivery(self) -> int:
+        """Id of the newest logged delivery; a new reader starts after it. shared_delivery only."""
+        raise NotImplementedError
+
+    def deliveries(self, after_id: int) -> List[Delivery]:
+        """Claimed items logged after `after_id`, oldest first. shared_delivery only."""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class InProcessQueue(QueueBackend):
+    """
+    Default backend: a heap in this process, ordered by (release time, id).
+    Peek is O(1); push, claim and defer are O(log n). The last release time
+    of each client with pending items is kept so its next push continues
+    that client's pacing.
+    """
+
+    def __init__(self):
+        # (release_at, item_id, client_id, query)
+        self._items: List[Tuple[float, int, Optional[str], str]] = []
+        self._next_id = 1
+        self._last_release: Dict[Optional[str], float] = {}
+        self._pending = Counter()
+        self._lock = threading.Lock()
+
+    def push(self, client_id, queries, next_release):
+        with self._lock:
+            for query in queries:
+                release_at = next_release(self._last_release.get(client_id, 0.0))
+                self._last_release[client_id] = release_at
+                self._pending[client_id] += 1
+                heapq.heappush(self._items, (release_at, self._next_id, client_id, query))
+                self._next_id += 1
+            return len(self._items)
+
+    def peek(self):
+        with self._lock:
+            if not self._items:
+                return None
+            release_at, item_id, client_id, query = self._items[0]
+            return item_id, release_at, client_id, query
+
+    def claim(self, item_id):
+        with self._lock:
+            if not self._items or self._items[0][1] != item_id:
+                return False
+            client_id = heapq.heappop(self._items)[2]
+            self._pending[client_id] -= 1
+            if not self._pending[client_id]:
+                del self._pending[client_id]
+                del self._last_release[client_id]
+            return True
+
+    def defer(self, item_id, release_at):
+        # Like claim, only ever called for the item peek returned
+        with self._lock:
+            if not self._items or self._items[0][1] != item_id:
+                return
+            _, _, client_id, query = self._items[0]
+            heapq.heapreplace(self._items, (release_at, item_id, client_id, query))
+            self._last_release[client_id] = max(self._last_release[client_id], release_at)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+
+class SQLiteQueue(QueueBackend):
+    """
+    Durable backend in a SQLite database in WAL mode. Pending queries survive
+    restarts, and every worker process on the host can share one file: pushes
+    are serialized by a write transaction and each item is claimed by exactly
+    one dispatcher. Claiming moves the item to a delivery log that every
+    process tails, so it reaches the client's stream whichever worker serves
+    it. Log entries are kept for `delivery_retention` seconds.
+    """
+
+    poll_interval = 1.0
+    shared_delivery = True
+    delivery_retention = 60.0
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS approved_queries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "release_at REAL NOT NULL, client_id TEXT, query TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS approved_queries_release ON approved_queries (release_at, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS approved_queries_client ON approved_queries (client_id, release_at)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS delivered_queries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "delivered_at REAL NOT NULL, client_id TEXT, query TEXT NOT NULL)"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def push(self, client_id, queries, next_release):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            (last_release,) = db.execute(
+                "SELECT COALESCE(MAX(release_at), 0) FROM approved_queries WHERE client_id IS ?", (client_id,)
+            ).fetchone()
+            rows = []
+            for query in queries:
+                last_release = next_release(last_release)
+                rows.append((last_release, client_id, query))
+            db.executemany("INSERT INTO approved_queries (release_at, client_id, query) VALUES (?, ?, ?)", rows)
+            (pending,) = db.execute("SELECT COUNT(*) FROM approved_queries").fetchone()
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return pending
+
+    def peek(self):
+        return self._db().execute(
+            "SELECT id, release_at, client_id, query FROM approved_queries ORDER BY release_at, id LIMIT 1"
+        ).fetchone()
+
+    def claim(self, item_id):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT client_id, query FROM approved_queries WHERE id = ?", (item_id,)).fetchone()
+            if row is not None:
+                now = time.time()
+                db.execute("DELETE FROM approved_queries WHERE id = ?", (item_id,))
+                db.execute("INSERT INTO delivered_queries (delivered_at, client_id, query) VALUES (?, ?, ?)",
+                           (now,) + tuple(row))
+                db.execute("DELETE FROM delivered_queries WHERE delivered_at < ?", (now - self.delivery_retention,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return row is not None
+
+    def defer(self, item_id, release_at):
+        self._db().execute("UPDATE approved_queries SET release_at = ? WHERE id = ?", (release_at, item_id))
+
+    def latest_delivery(self):
+        return self._db().execute("SELECT COALESCE(MAX(id), 0) FROM delivered_queries").fetchone()[0]
+
+    def deliveries(self, after_id):
+        return self._db().execute(
+            "SELECT id, client_id, query FROM delivered_queries WHERE id > ? ORDER BY id", (after_id,)
+        ).fetchall()
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM approved_queries").fetchone()[0]
@@ -0,0 +1,148 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List
+
+
+class QueryReservoir:
+    """
+    Per-persona reservoirs of freshly generated queries, kept topped up by
+    background worker threads.
+
+    Whenever a reservoir drops below `low_watermark` it is queued for refill,
+    and a worker calls `generate(persona_id)` until it holds at least
+    `high_watermark` queries. Requests only ever pop from the reservoirs, so
+    their latency does not depend on the LLM.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], List[str]],
+        persona_ids: Iterable[str],
+        low_watermark: int = 10,
+        high_watermark: int = 30,
+        workers: int = 1,
+        retry_delay: float = 30.0):
+
+        self.generate = generate
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.workers = workers
+        self.retry_delay = retry_delay
+
+        self._reservoirs: Dict[str, deque] = {pid: deque() for pid in persona_ids}
+        self._lock = threading.Lock()
+        self._refill_queue = queue.Queue()
+        self._pending = set()
+        self._threads = []
+
+        self._stats = {
+            pid: {
+                'served': 0,
+                'shortfalls': 0,
+                'refills': 0,
+                'failures': 0,
+                'last_refill_seconds': None,
+                'total_refill_seconds': 0.0
+            }
+            for pid in self._reservoirs
+        }
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f'query-reservoir-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+        for pid in self._reservoirs:
+            self._schedule_refill(pid)
+
+    def take(self, persona_id: str, count: int) -> List[str]:
+        """Pop up to `count` fresh queries; may return fewer if the reservoir is low."""
+        reservoir = self._reservoirs.get(persona_id)
+        if reservoir is None:
+            return []
+
+        with self._lock:
+            taken = [reservoir.popleft() for _ in range(min(count, len(reservoir)))]
+            stats = self._stats[persona_id]
+            stats['served'] += len(taken)
+            if len(taken) < count:
+                stats['shortfalls'] += 1
+            low = len(reservoir) < self.low_watermark
+
+        if low:
+            self._schedule_refill(persona_id)
+        return taken
+
+    def peek(self, persona_id: str) -> List[str]:
+        """The queries waiting in a persona's reservoir, without taking them."""
+        reservoir = self._reservoirs.get(persona_id)
+        if reservoir is None:
+            return []
+        with self._lock:
+            return list(reservoir)
+
+    def depth(self, persona_id: str) -> int:
+        reservoir = self._reservoirs.get(persona_id)
+        return len(reservoir) if reservoir is not None else 0
+
+    def _schedule_refill(self, persona_id: str) -> None:
+        with self._lock:
+            if persona_id in self._pending:
+                return
+            self._pending.add(persona_id)
+        self._refill_queue.put(persona_id)
+
+    def _worker(self) -> None:
+        while True:
+            persona_id = self._refill_queue.get()
+            try:
+                self._refill(persona_id)
+            finally:
+                with self._lock:
+                    self._pending.discard(persona_id)
+
+    def _refill(self, persona_id: str) -> None:
+        reservoir = self._reservoirs[persona_id]
+        stats = self._stats[persona_id]
+
+        while len(reservoir) < self.high_watermark:
+            started = time.perf_counter()
+            try:
+                queries = self.generate(persona_id)
+            except Exception as e:
+                print(f"Reservoir refill failed for {persona_id}: {e}")
+                with self._lock:
+                    stats['failures'] += 1
+                # Back off and wait for the next take() to ask again rather
+                # than hammering an unavailable model server.
+                time.sleep(self.retry_delay)
+                return
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                before = len(reservoir)
+                known = set(reservoir)
+                reservoir.extend(q for q in dict.fromkeys(queries) if q not in known)
+                added = len(reservoir) - before
+                stats['refills'] += 1
+                stats['last_refill_seconds'] = elapsed
+                stats['total_refill_seconds'] += elapsed
+
+            if not added:
+                break
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for pid, reservoir in self._reservoirs.items():
+                stats = dict(self._stats[pid])
+                total_seconds = stats.pop('total_refill_seconds')
+                stats['avg_refill_seconds'] = total_seconds / stats['refills'] if stats['refills'] else None
+                stats['depth'] = len(reservoir)
+                stats['refilling'] = pid in self._pending
+                result[pid] = stats
+            return result
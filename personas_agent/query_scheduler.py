@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from query_queue import InProcessQueue, QueueBackend
+
+
+class QueryScheduler:
+    """
+    Releases approved queries one at a time with human-like pacing.
+
+    Each query is given a release time `min_delay`-`max_delay` seconds after
+    the same client's previous one when it is scheduled, and stored in a
+    QueueBackend (in-process by default, or durable and shared between
+    processes). Clients are paced independently, so a long backlog for one
+    client does not hold back anyone else. The dispatcher thread sleeps on a
+    condition variable until the next query is due instead of polling;
+    backends shared with other processes are also re-checked every
+    `backend.poll_interval` seconds.
+    """
+
+    def __init__(self, min_delay: float = 2.0, max_delay: float = 5.0, backend: Optional[QueueBackend] = None):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backend = backend if backend is not None else InProcessQueue()
+        # client_id -> when its last query was delivered / the latest release
+        # time an overdue query of that client was deferred to
+        self._last_delivered: Dict[Optional[str], float] = {}
+        self._deferred_until: Dict[Optional[str], float] = {}
+        self._deferred: Set[int] = set()
+        self._cond = threading.Condition()
+        self._relay_cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    def _next_release(self, previous: float) -> float:
+        return max(previous, time.time()) + random.uniform(self.min_delay, self.max_delay)
+
+    def schedule(self, queries: Iterable[str], client_id: Optional[str] = None) -> int:
+        """
+        Queue queries for release to `client_id` (None for every client) and
+        return the number now pending.
+        """
+        pending = self.backend.push(client_id, list(queries), self._next_release)
+        with self._cond:
+            self._cond.notify()
+        return pending
+
+    def _wait(self, timeout: Optional[float]) -> None:
+        poll = self.backend.poll_interval
+        if poll is not None:
+            timeout = poll if timeout is None else min(timeout, poll)
+        self._cond.wait(timeout)
+
+    def next_due(self) -> Tuple[Optional[str], str]:
+        """Block until the next query is due and return (client_id, query)."""
+        with self._cond:
+            while True:
+                item = self.backend.peek()
+                if item is None:
+                    self._wait(None)
+                    continue
+                item_id, release_at, client_id, query = item
+                # Keep the client's pacing even when its backlog is overdue,
+                # e.g. after a restart: move the query behind the last one
+                # delivered (or deferred) rather than block the queue head
+                due = max(release_at, self._last_delivered.get(client_id, 0.0) + self.min_delay)
+                if due > release_at and item_id not in self._deferred:
+                    due = max(due, self._deferred_until.get(client_id, 0.0) + self.min_delay)
+                    self._deferred_until[client_id] = due
+                    self._deferred.add(item_id)
+                    self.backend.defer(item_id, due)
+                    continue
+                remaining = due - time.time()
+                if remaining > 0:
+                    self._wait(remaining)
+                    continue
+                claimed = self.backend.claim(item_id)
+                self._deferred.discard(item_id)
+                if not claimed:
+                    # Another process dispatched it first
+                    continue
+                now = time.time()
+                self._last_delivered[client_id] = now
+                self._forget_idle(now)
+                return client_id, query
+
+    def _forget_idle(self, now: float) -> None:
+        # Pacing state older than min_delay no longer constrains anything
+        for times in (self._last_delivered, self._deferred_until):
+            for client_id in [c for c, t in times.items() if t + self.min_delay < now]:
+                del times[client_id]
+
+    def start(self, deliver: Callable[[Optional[str], str], None]) -> None:
+        """
+        Start dispatching due queries to `deliver`. With a shared_delivery
+        backend the dispatcher only claims; a relay thread passes every
+        process's claimed queries to `deliver`, so each process reaches the
+        streams it holds.
+        """
+        if self._thread is not None:
+            return
+
+        def safe_deliver(client_id, query):
+            try:
+                deliver(client_id, query)
+            except Exception as e:
+                print(f"Error delivering query: {e}")
+
+        def run():
+            while True:
+                client_id, query = self.next_due()
+                if self.backend.shared_delivery:
+                    # Wake this process's relay rather than wait for its next poll
+                    with self._relay_cond:
+                        self._relay_cond.notify()
+                else:
+                    safe_deliver(client_id, query)
+
+        def relay():
+            cursor = self.backend.latest_delivery()
+            # Held while reading, so a wakeup cannot slip in before the wait
+            with self._relay_cond:
+                while True:
+                    for cursor, client_id, query in self.backend.deliveries(cursor):
+                        safe_deliver(client_id, query)
+                    self._relay_cond.wait(self.backend.poll_interval)
+
+        if self.backend.shared_delivery:
+            threading.Thread(target=relay, name='query-relay', daemon=True).start()
+        self._thread = threading.Thread(target=run, name='query-dispatcher', daemon=True)
+        self._thread.start()
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def content_key(namespace: str, data: Any) -> str:
+    """Stable hash of a JSON value: key order and whitespace do not matter."""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(f'{namespace}\n{canonical}'.encode(), digest_size=16).hexdigest()
+
+
+def raw_key(namespace: str, body: bytes) -> str:
+    h = hashlib.blake2b(namespace.encode() + b'\n', digest_size=16)
+    h.update(body)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Serialized JSON responses keyed by a content hash of the request.
+
+    Entries are evicted least recently used first once their bodies add up
+    to more than `max_bytes`. The hash of each request's raw bytes is
+    remembered as an alias of its content key, so a client re-sending the
+    same bytes is answered without parsing the body at all; reformatted but
+    equal bodies still meet at the content key.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_aliases: int = 4096):
+        self.max_bytes = max_bytes
+        self.max_aliases = max_aliases
+
+        # content key -> (response body, meta)
+        self._entries: Dict[str, Tuple[bytes, Hashable]] = OrderedDict()
+        # raw body hash -> content key
+        self._aliases: Dict[str, str] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def alias(self, raw: str) -> Optional[str]:
+        with self._lock:
+            key = self._aliases.get(raw)
+            if key is not None:
+                self._aliases.move_to_end(raw)
+            return key
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Hashable]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, body: bytes, meta: Hashable = None, raw: Optional[str] = None) -> None:
+        with self._lock:
+            if raw is not None:
+                self._aliases[raw] = key
+                self._aliases.move_to_end(raw)
+                while len(self._aliases) > self.max_aliases:
+                    self._aliases.popitem(last=False)
+
+            if len(body) > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (body, meta)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= len(entry[0])
+
+    def record(self, result: str) -> None:
+        """Count a lookup: 'hit', 'miss' or 'not_modified'."""
+        with self._lock:
+            if result == 'hit':
+                self.hits += 1
+            elif result == 'miss':
+                self.misses += 1
+            else:
+                self.not_modified += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified
+            }
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+
+class SSEChannel:
+    """
+    Bounded event log for one client. Each open connection reads from its own
+    cursor (the last event id it sent), so reconnecting with Last-Event-ID
+    resumes exactly where it left off. When a connection falls more than
+    `max_buffer` events behind, the oldest events are dropped and counted.
+    """
+
+    def __init__(self, max_buffer: int):
+        self._events = deque(maxlen=max_buffer)  # (event_id, data, event name or None)
+        self._next_id = 1
+        self._cond = threading.Condition()
+        # (event loop, asyncio.Event) for connections served by the async server
+        self._async_waiters = set()
+        self.connections = 0
+        self.dropped = 0
+        self.last_active = time.time()
+
+    @property
+    def latest_id(self) -> int:
+        with self._cond:
+            return self._next_id - 1
+
+    def publish(self, data: str, event: Optional[str] = None) -> int:
+        with self._cond:
+            event_id = self._next_id
+            self._next_id += 1
+            self._events.append((event_id, data, event))
+            self.last_active = time.time()
+            self._cond.notify_all()
+            for loop, waiter in self._async_waiters:
+                loop.call_soon_threadsafe(waiter.set)
+            return event_id
+
+    def _collect(self, cursor: int) -> List[Tuple[int, str, Optional[str]]]:
+        if cursor >= self._next_id:
+            # Cursor from before a server restart; nothing newer to replay
+            cursor = self._next_id - 1
+        events = [e for e in self._events if e[0] > cursor]
+        if events and events[0][0] > cursor + 1:
+            self.dropped += events[0][0] - cursor - 1
+        return events
+
+    def read(self, cursor: int, timeout: float) -> List[Tuple[int, str, Optional[str]]]:
+        """Events after `cursor`, waiting up to `timeout` seconds for one to arrive."""
+        with self._cond:
+            events = self._collect(cursor)
+            if events:
+                return events
+            self._cond.wait(timeout)
+            return self._collect(cursor)
+
+    async def read_async(self, cursor: int, timeout: float) -> List[Tuple[int, str, Optional[str]]]:
+        """read() for coroutines: waits on an asyncio.Event instead of blocking a thread."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            events = self._collect(cursor)
+            if events:
+                return events
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+        with self._cond:
+            return self._collect(cursor)
+
+
+class SSEHub:
+    """
+    Per-client SSE channels. Events published for a client id only reach that
+    client's connections; publishing for None reaches every channel. Idle
+    channels with no open connections are evicted after `idle_ttl` seconds or
+    when more than `max_channels` exist.
+    """
+
+    def __init__(self, max_buffer: int = 100, max_channels: int = 1000, idle_ttl: float = 60 * 60):
+        self.max_buffer = max_buffer
+        self.max_channels = max_channels
+        self.idle_ttl = idle_ttl
+        self._channels: Dict[str, SSEChannel] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self) -> None:
+        now = time.time()
+        for client_id in list(self._channels):
+            channel = self._channels[client_id]
+            over_capacity = len(self._channels) >= self.max_channels
+            if channel.connections == 0 and (over_capacity or now - channel.last_active > self.idle_ttl):
+                del self._channels[client_id]
+
+    def channel(self, client_id: str) -> SSEChannel:
+        with self._lock:
+            channel = self._channels.get(client_id)
+            if channel is None:
+                self._evict()
+                channel = self._channels[client_id] = SSEChannel(self.max_buffer)
+            self._channels.move_to_end(client_id)
+            return channel
+
+    def connect(self, client_id: str) -> SSEChannel:
+        channel = self.channel(client_id)
+        with self._lock:
+            channel.connections += 1
+        return channel
+
+    def disconnect(self, client_id: str) -> None:
+        with self._lock:
+            channel = self._channels.get(client_id)
+            if channel is not None:
+                channel.connections -= 1
+                channel.last_active = time.time()
+
+    def publish(self, client_id: Optional[str], data: str, event: Optional[str] = None) -> None:
+        """
+        Send `data` to one client (or all for None). `event` names the SSE
+        event type; unnamed events arrive as plain messages.
+        """
+        if client_id is not None:
+            self.channel(client_id).publish(data, event)
+            return
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            channel.publish(data, event)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'channels': len(self._channels),
+                'connections': sum(c.connections for c in self._channels.values()),
+                'dropped_events': sum(c.dropped for c in self._channels.values())
+            }
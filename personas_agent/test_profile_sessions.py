@@ -0,0 +1,31 @@
+import os
+import sys
+
+os.environ.setdefault('PREGENERATE_QUERIES', '0')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import flask_app
+
+
+HISTORY = {'searches': [{'query': 'best running shoes'}, {'query': 'python tutorial'}]}
+
+
+def test_same_history_gets_separate_sessions():
+    alice = flask_app.app.test_client()
+    bob = flask_app.app.test_client()
+
+    a = alice.post('/api/analyze-profile', json=HISTORY).get_json()
+    b = bob.post('/api/analyze-profile', json=HISTORY).get_json()
+    assert a['session_id'] != b['session_id']
+    assert b['profile']['metadata']['session_id'] == b['session_id']
+
+    alice.post(f"/api/profile-sessions/{a['session_id']}/searches",
+               json={'searches': [{'query': 'divorce lawyer custody'}]})
+    updated = bob.post(f"/api/profile-sessions/{b['session_id']}/searches",
+                       json={'searches': [{'query': 'cheap flights'}]}).get_json()
+    assert updated['profile']['metadata']['total_searches'] == 3
+    assert 'divorce' not in str(updated)
+
+    again = bob.post('/api/analyze-profile', json=HISTORY).get_json()
+    assert again['profile']['metadata']['total_searches'] == 2
+    assert again['session_id'] not in (a['session_id'], b['session_id'])
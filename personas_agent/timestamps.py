@@ -0,0 +1,120 @@
+import math
+from array import array
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional
+
+try:
+    from dateutil.parser import parse as _parse_fuzzy
+except ImportError:
+    _parse_fuzzy = None
+
+MS_PER_HOUR = 60 * 60 * 1000
+MS_PER_DAY = 24 * MS_PER_HOUR
+
+# Formats of the "My Activity" HTML export of Google Takeout, e.g.
+# "Jan 5, 2024, 3:04:05 PM UTC" and the day-first variant used outside the US
+TAKEOUT_FORMATS = ('%b %d, %Y, %I:%M:%S %p %Z', '%d %b %Y, %H:%M:%S %Z')
+
+# What a converter raises for a value that is not in its format
+_PARSE_ERRORS = (ValueError, TypeError, OverflowError, AttributeError)
+
+
+def _from_number(value: Any) -> float:
+    ts = float(value)
+    if not math.isfinite(ts):
+        raise ValueError(f'Not a timestamp: {value!r}')
+    magnitude = abs(ts)
+    if magnitude >= 1e14:
+        return ts / 1000  # microseconds (Takeout JSON "time_usec")
+    if magnitude >= 1e11:
+        return ts  # milliseconds
+    return ts * 1000  # seconds
+
+
+def _from_iso(value: str) -> float:
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value).timestamp() * 1000
+
+
+def _from_takeout(value: str) -> float:
+    value = value.replace('\u202f', ' ')  # newer exports use a narrow no-break space before AM/PM
+    for fmt in TAKEOUT_FORMATS:
+        try:
+            # %Z accepts but ignores the zone name; Takeout always writes UTC
+            return (datetime.strptime(value, fmt) - datetime(1970, 1, 1)).total_seconds() * 1000
+        except ValueError:
+            continue
+    raise ValueError(f'Not a Takeout timestamp: {value!r}')
+
+
+def _from_fuzzy(value: str) -> float:
+    return _parse_fuzzy(value).timestamp() * 1000
+
+
+def _detect(value: Any) -> Optional[Callable[[Any], float]]:
+    """The converter for value's format, or None if it is not a timestamp."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return _from_number
+    if not isinstance(value, str) or not value.strip():
+        return None
+    candidates = [_from_number, _from_iso, _from_takeout]
+    if _parse_fuzzy is not None:
+        candidates.append(_from_fuzzy)
+    for convert in candidates:
+        try:
+            convert(value)
+            return convert
+        except _PARSE_ERRORS:
+            continue
+    return None
+
+
+class TimestampParser:
+    """
+    Converts search timestamps to epoch milliseconds.
+
+    The format (epoch ms, s or us, ISO-8601, Takeout activity export) is
+    detected from the first value and that converter is reused for the rest,
+    so a history costs one fast conversion per item; the full dateutil parse
+    is only a fallback for formats none of the fast paths recognize. A value
+    the current converter rejects triggers detection again, so mixed
+    histories still parse. Unparseable values become 0.0.
+    """
+
+    def __init__(self):
+        self._convert: Optional[Callable[[Any], float]] = None
+
+    @property
+    def format(self) -> Optional[str]:
+        return self._convert.__name__[len('_from_'):] if self._convert else None
+
+    def parse(self, value: Any) -> float:
+        if self._convert is not None:
+            try:
+                return self._convert(value)
+            except _PARSE_ERRORS:
+                pass
+        convert = _detect(value)
+        if convert is None:
+            return 0.0
+        self._convert = convert
+        return convert(value)
+
+    def parse_many(self, values: Iterable[Any]) -> array:
+        """Epoch milliseconds for every value, as a compact array of doubles."""
+        return array('d', map(self.parse, values))
+
+
+def hour_of_day(ts: float) -> int:
+    """UTC hour (0-23) of an epoch-millisecond timestamp."""
+    return int(ts // MS_PER_HOUR) % 24
+
+
+def weekday(ts: float) -> int:
+    """UTC weekday (Monday=0) of an epoch-millisecond timestamp."""
+    # 1970-01-01 was a Thursday
+    return (int(ts // MS_PER_DAY) + 3) % 7
+
@@ -1,13 +1,390 @@
+import os
+import json
+import time
+import asyncio
+import threading
 import requests
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, List
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+from metrics import METRICS
+from llm_scheduler import get_llm_scheduler
+
+try:
+    import httpx
+except ImportError:  # only needed by the async server (asgi_app.py)
+    httpx = None
+
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_URL = f"{OLLAMA_BASE_URL}/api/generate"
+
+# Small CPU-friendly embedding model (`ollama pull nomic-embed-text`)
+EMBEDDING_MODEL = os.environ.get("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+
+# Status codes worth retrying: the model server is restarting or overloaded
+RETRY_STATUS_CODES = {429, 502, 503, 504}
 
 
 class OllamaError(Exception):
     pass
 
 
+METRICS.describe("ollama_requests_total", "counter", "Ollama calls by model, endpoint and outcome")
+METRICS.describe("ollama_request_seconds", "histogram", "Wall-clock time of Ollama calls, including retries")
+METRICS.describe("ollama_prompt_tokens_total", "counter", "Prompt tokens evaluated (prompt_eval_count)")
+METRICS.describe("ollama_eval_tokens_total", "counter", "Tokens generated (eval_count)")
+METRICS.describe("ollama_prompt_eval_seconds_total", "counter", "Time Ollama spent on prompts (prompt_eval_duration)")
+METRICS.describe("ollama_eval_seconds_total", "counter", "Time Ollama spent generating (eval_duration)")
+
+
+def _record_call(model: str, endpoint: str, started: float, data: Optional[Dict[str, Any]]) -> None:
+    """Count one Ollama call; `data` is the final response body, or None if the call failed."""
+    METRICS.inc("ollama_requests_total", model=model, endpoint=endpoint, outcome="error" if data is None else "ok")
+    METRICS.observe("ollama_request_seconds", time.perf_counter() - started, model=model, endpoint=endpoint)
+    if data:
+        METRICS.inc("ollama_prompt_tokens_total", data.get("prompt_eval_count", 0), model=model)
+        METRICS.inc("ollama_eval_tokens_total", data.get("eval_count", 0), model=model)
+        METRICS.inc("ollama_prompt_eval_seconds_total", data.get("prompt_eval_duration", 0) / 1e9, model=model)
+        METRICS.inc("ollama_eval_seconds_total", data.get("eval_duration", 0) / 1e9, model=model)
+
+
+class OllamaClient:
+    """
+    Reusable Ollama client. Keeps pooled keep-alive connections to the server,
+    retries transient failures with exponential backoff and can stream tokens
+    as they are generated. Point `base_url` at a stub server for tests.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        pool_size: int = 10,
+        max_retries: int = 2,
+        backoff: float = 0.5):
+
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def _payload(
+        prompt: str,
+        model: str,
+        system: Optional[str],
+        temperature: float,
+        stream: bool,
+        extra_options: Optional[Dict[str, Any]],
+        format: Optional[str] = None) -> Dict[str, Any]:
+
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": temperature,
+            },
+        }
+
+        if system:
+            payload["system"] = system
+
+        if format:
+            payload["format"] = format
+
+        if extra_options:
+            payload["options"].update(extra_options)
+
+        return payload
+
+    def _post(self, payload: Dict[str, Any], timeout: int, path: str = "/api/generate") -> requests.Response:
+        """
+        Retries only failures where the server cannot have started on the
+        prompt (refused or dropped connections, RETRY_STATUS_CODES) and only
+        within `timeout` seconds overall. A read timeout means the model is
+        still busy, so resending would just queue the same work again.
+        """
+        url = f"{self.base_url}{path}"
+        deadline = time.monotonic() + timeout
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self.session.post(
+                    url,
+                    json=payload,
+                    timeout=max(deadline - time.monotonic(), 0.1),
+                    stream=payload.get("stream", False),
+                )
+            # ConnectTimeout is a ConnectionError; ReadTimeout is not
+            except requests.exceptions.ConnectionError as e:
+                error = f"Ollama request failed: {e}"
+            except requests.exceptions.RequestException as e:
+                raise OllamaError(f"Ollama request failed: {e}")
+            else:
+                if response.status_code == 200:
+                    return response
+                error = f"Ollama returned status {response.status_code}: {response.text}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise OllamaError(error)
+                response.close()
+
+            delay = self.backoff * (2 ** attempt)
+            if last_attempt or time.monotonic() + delay >= deadline:
+                raise OllamaError(error)
+            time.sleep(delay)
+
+    def generate_raw(
+        self,
+        prompt: str,
+        model: str = "llama3.2",
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        extra_options: Optional[Dict[str, Any]] = None,
+        format: Optional[str] = None) -> Dict[str, Any]:
+        """The full Ollama response body, including its token counts and durations."""
+
+        payload = self._payload(prompt, model, system, temperature, False, extra_options, format)
+        started = time.perf_counter()
+        data = None
+        try:
+            data = self._post(payload, timeout).json()
+        finally:
+            _record_call(model, "generate", started, data if data and "response" in data else None)
+
+        if "response" not in data:
+            raise OllamaError(f"Unexpected Ollama response format: {data}")
+
+        return data
+
+    def generate(
+        self,
+        prompt: str,
+        model: str = "llama3.2",
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        extra_options: Optional[Dict[str, Any]] = None,
+        format: Optional[str] = None) -> str:
+
+        return self.generate_raw(prompt, model, system, temperature, timeout, extra_options, format)["response"]
+
+    def generate_stream(
+        self,
+        prompt: str,
+        model: str = "llama3.2",
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        extra_options: Optional[Dict[str, Any]] = None,
+        format: Optional[str] = None) -> Iterator[str]:
+        """Yield response text fragments as Ollama streams its NDJSON chunks."""
+
+        payload = self._payload(prompt, model, system, temperature, True, extra_options, format)
+        started = time.perf_counter()
+        final = None
+        try:
+            response = self._post(payload, timeout)
+        except OllamaError:
+            _record_call(model, "generate", started, None)
+            raise
+
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError:
+                    raise OllamaError(f"Malformed Ollama stream chunk: {line!r}")
+                if "error" in chunk:
+                    raise OllamaError(f"Ollama stream error: {chunk['error']}")
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    # The last chunk carries the token counts and durations
+                    final = chunk
+                    break
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"Ollama stream interrupted: {e}")
+        finally:
+            response.close()
+            _record_call(model, "generate", started, final)
+
+    def embed(self, texts: List[str], model: str = EMBEDDING_MODEL, timeout: int = 60) -> List[List[float]]:
+        """One embedding vector per text, from Ollama's /api/embed in a single request."""
+
+        payload = {"model": model, "input": list(texts)}
+        started = time.perf_counter()
+        data = None
+        try:
+            data = self._post(payload, timeout, path="/api/embed").json()
+        finally:
+            _record_call(model, "embed", started, data)
+
+        embeddings = data.get("embeddings")
+        if not isinstance(embeddings, list) or len(embeddings) != len(payload["input"]):
+            raise OllamaError(f"Unexpected Ollama embedding response: {str(data)[:200]}")
+
+        return embeddings
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncOllamaClient:
+    """
+    asyncio counterpart of OllamaClient for the async server, built on
+    httpx.AsyncClient so awaiting a generation does not tie up a thread.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        pool_size: int = 10,
+        max_retries: int = 2,
+        backoff: float = 0.5):
+
+        if httpx is None:
+            raise OllamaError("httpx is required for AsyncOllamaClient (pip install httpx)")
+
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def _send(self, payload: Dict[str, Any], timeout: int):
+        """Retries like OllamaClient._post: connection failures and RETRY_STATUS_CODES, within `timeout`."""
+        url = f"{self.base_url}/api/generate"
+        deadline = time.monotonic() + timeout
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            request = self.client.build_request(
+                "POST", url, json=payload, timeout=max(deadline - time.monotonic(), 0.1)
+            )
+            try:
+                response = await self.client.send(request, stream=True)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                error = f"Ollama request failed: {e}"
+            except httpx.HTTPError as e:
+                raise OllamaError(f"Ollama request failed: {e}")
+            else:
+                if response.status_code == 200:
+                    return response
+                body = (await response.aread()).decode(errors="replace")
+                await response.aclose()
+                error = f"Ollama returned status {response.status_code}: {body}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise OllamaError(error)
+
+            delay = self.backoff * (2 ** attempt)
+            if last_attempt or time.monotonic() + delay >= deadline:
+                raise OllamaError(error)
+            await asyncio.sleep(delay)
+
+    async def generate_raw(
+        self,
+        prompt: str,
+        model: str = "llama3.2",
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        extra_options: Optional[Dict[str, Any]] = None,
+        format: Optional[str] = None) -> Dict[str, Any]:
+
+        payload = OllamaClient._payload(prompt, model, system, temperature, False, extra_options, format)
+        started = time.perf_counter()
+        data = None
+        try:
+            response = await self._send(payload, timeout)
+            try:
+                data = json.loads(await response.aread())
+            except httpx.HTTPError as e:
+                raise OllamaError(f"Ollama request failed: {e}")
+            finally:
+                await response.aclose()
+        finally:
+            _record_call(model, "generate", started, data if data and "response" in data else None)
+
+        if "response" not in data:
+            raise OllamaError(f"Unexpected Ollama response format: {data}")
+
+        return data
+
+    async def generate(self, prompt: str, model: str = "llama3.2", **kwargs) -> str:
+        return (await self.generate_raw(prompt, model, **kwargs))["response"]
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        model: str = "llama3.2",
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        extra_options: Optional[Dict[str, Any]] = None,
+        format: Optional[str] = None) -> AsyncIterator[str]:
+
+        payload = OllamaClient._payload(prompt, model, system, temperature, True, extra_options, format)
+        started = time.perf_counter()
+        final = None
+        try:
+            response = await self._send(payload, timeout)
+        except OllamaError:
+            _record_call(model, "generate", started, None)
+            raise
+
+        try:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError:
+                    raise OllamaError(f"Malformed Ollama stream chunk: {line!r}")
+                if "error" in chunk:
+                    raise OllamaError(f"Ollama stream error: {chunk['error']}")
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    final = chunk
+                    break
+        except httpx.HTTPError as e:
+            raise OllamaError(f"Ollama stream interrupted: {e}")
+        finally:
+            await response.aclose()
+            _record_call(model, "generate", started, final)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_client: Optional[OllamaClient] = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+
+def set_ollama_client(client: OllamaClient) -> None:
+    """Replace the shared client, e.g. with one pointed at a stub server."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
 def query_ollama(
     prompt: str,
     model: str = "llama3.2",
@@ -15,40 +392,21 @@ def query_ollama(
     temperature: float = 0.7,
     stream: bool = False,
     timeout: int = 120,
-    extra_options: Optional[Dict[str, Any]] = None) -> str:
-
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": stream,
-        "options": {
-            "temperature": temperature,
-        },
-    }
-
-    if system:
-        payload["system"] = system
-
-    if extra_options:
-        payload["options"].update(extra_options)
-
-    try:
-        response = requests.post(
-            OLLAMA_URL,
-            json=payload,
-            timeout=timeout,
-        )
-    except requests.exceptions.RequestException as e:
-        raise OllamaError(f"Ollama request failed: {e}")
+    extra_options: Optional[Dict[str, Any]] = None,
+    format: Optional[str] = None) -> str:
 
-    if response.status_code != 200:
-        raise OllamaError(
-            f"Ollama returned status {response.status_code}: {response.text}"
-        )
+    client = get_ollama_client()
+
+    # Waits for a slot at the caller's llm_priority; raises LLMOverloaded when shed
+    with get_llm_scheduler().slot():
+        if stream:
+            return "".join(client.generate_stream(
+                prompt, model, system, temperature, timeout, extra_options, format
+            ))
 
-    data = response.json()
+        return client.generate(prompt, model, system, temperature, timeout, extra_options, format)
 
-    if "response" not in data:
-        raise OllamaError(f"Unexpected Ollama response format: {data}")
 
-    return data["response"]
+def embed_texts(texts: List[str], model: str = EMBEDDING_MODEL, timeout: int = 60) -> List[List[float]]:
+    with get_llm_scheduler().slot():
+        return get_ollama_client().embed(texts, model, timeout)
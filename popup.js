@@ -174,7 +174,13 @@ async function analyzeSearchHistory() {
     if (!resp.ok) throw new Error((await resp.json()).error || 'Analysis failed');
 
     const { profile } = await resp.json();
-    await chrome.storage.local.set({ initialProfile: profile, profileTimestamp: Date.now() });
+    // The history is kept so profile updates can re-analyze it if its session is gone
+    await chrome.storage.local.set({
+      initialProfile: profile,
+      searchHistory: searches,
+      profileSessionId: null,
+      profileTimestamp: Date.now()
+    });
     showStatus('Profile created – generating personas...', 'success');
 
     await generatePersonas(profile);